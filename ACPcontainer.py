@@ -27,12 +27,12 @@ import ipaddress
 
 def dump_some():
     grasp.tprint("Objective registry contents:")         
-    for x in grasp._obj_registry:
+    for x in grasp._obj_registry.values():
         o= x.objective
         grasp.tprint(o.name,"ASA:",x.asa_id,"Listen:",x.listening,"Neg:",o.neg,
                "Synch:",o.synch,"Count:",o.loop_count,"Value:",o.value)
     grasp.tprint("Flood cache contents:")            
-    for x in grasp._flood_cache:
+    for x in grasp._flood_cache.values():
         grasp.tprint(x.objective.name,"count:",x.objective.loop_count,"value:",
                      x.objective.value,"source",x.source.locator, x.source.protocol,
                      x.source.port,"expiry",x.source.expire)
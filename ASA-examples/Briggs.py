@@ -29,27 +29,27 @@ import random
 # Flood EX1 repeatedly
 ####################################
 
-class flooder(threading.Thread):
-    """Thread to flood EX1 repeatedly"""
-    global keep_going
-    def __init__(self):
-        threading.Thread.__init__(self, daemon=True)
-
-    def run(self):
-        while keep_going:
-            time.sleep(60)
-            obj1.value = datetime.datetime.now(datetime.UTC).strftime("%Y-%m-%d %H:%M UTC from Briggs")
-            err = graspi.flood(asa_handle, 59000, [graspi.tagged_objective(obj1,None)])
-            if err:
-                graspi.tprint("Flood failure:",graspi.etext[err])
-            time.sleep(5)
-            if _old_API:
-                if graspi.test_mode:
-                    dump_some()
-            else:
-                if graspi.grasp.test_mode:
-                    dump_some()
+def flood_tick():
+    """Called every minute by the GRASP timer"""
+    if not keep_going:
+        flood_timer.cancel()
         graspi.tprint("Flooder exiting")
+        return
+    #flood() may block, so not in the shared timer thread
+    threading.Thread(target=flooder, daemon=True).start()
+
+def flooder():
+    """Flood EX1 once"""
+    obj1.value = datetime.datetime.now(datetime.UTC).strftime("%Y-%m-%d %H:%M UTC from Briggs")
+    err = graspi.flood(asa_handle, 59000, [graspi.tagged_objective(obj1,None)])
+    if err:
+        graspi.tprint("Flood failure:",graspi.etext[err])
+    if _old_API:
+        if graspi.test_mode:
+            graspi.dump_all(partial=True)
+    else:
+        if graspi.grasp.test_mode:
+            graspi.dump_all(partial=True)
 
 
 ###################################
@@ -250,7 +250,7 @@ else:
 
 dump_some()
 
-flooder().start()
+flood_timer = graspi.call_every(60000, flood_tick)
 graspi.tprint("Flooding EX1 for ever")
 
 ###################################
@@ -31,12 +31,12 @@ _prng = random.SystemRandom() # best PRNG we can get
 
 def dump_some():
     graspi.tprint("Objective registry contents:")         
-    for x in graspi.grasp._obj_registry:
+    for x in graspi.grasp._obj_registry.values():
         o= x.objective
         graspi.tprint(o.name,"ASA:",x.asa_id,"Listen:",x.listening,"Neg:",o.neg,
                "Synch:",o.synch,"Count:",o.loop_count,"Value:",o.value)
     graspi.tprint("Flood cache contents:")            
-    for x in graspi.grasp._flood_cache:
+    for x in graspi.grasp._flood_cache.values():
         graspi.tprint(x.objective.name,"count:",x.objective.loop_count,"value:",
                      x.objective.value,"source",x.source.locator, x.source.protocol,
                      x.source.port,"expiry",x.source.expire)
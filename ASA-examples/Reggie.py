@@ -10,7 +10,6 @@ The actual BRSKI transactions are not included.
 import sys
 sys.path.insert(0, '..') # in case graspi.py is one level up
 import graspi
-import threading
 import time
 import socket
 #fix very old bug
@@ -27,31 +26,25 @@ except:
 
 def dump_some():
     graspi.tprint("Objective registry contents:")         
-    for x in graspi.grasp._obj_registry:
+    for x in graspi.grasp._obj_registry.values():
         o= x.objective
         graspi.tprint(o.name,"ASA:",x.asa_id,"Listen:",x.listening,"Neg:",o.neg,
                "Synch:",o.synch,"Count:",o.loop_count,"Value:",o.value)
     graspi.tprint("Flood cache contents:")            
-    for x in graspi.grasp._flood_cache:
+    for x in graspi.grasp._flood_cache.values():
         graspi.tprint(x.objective.name,"count:",x.objective.loop_count,"value:",
                      x.objective.value,"source",x.source.locator, x.source.protocol,
                      x.source.port,"expiry",x.source.expire)
 
 ####################################
-# Thread to flood the objective repeatedly
+# Flood the objective repeatedly
 ####################################
 
-class flooder(threading.Thread):
-    """Thread to flood objectve repeatedly"""
-    def __init__(self):
-        threading.Thread.__init__(self)
-
-    def run(self):
-        while True:
-            time.sleep(60)
-            reg_obj.value = "EST-TLS"
-            graspi.flood(asa_nonce, 120000,
-                        graspi.tagged_objective(reg_obj,tcp_locator))
+def flooder():
+    """Flood objective, called every minute by the main loop"""
+    reg_obj.value = "EST-TLS"
+    graspi.flood(asa_nonce, 120000,
+                graspi.tagged_objective(reg_obj,tcp_locator))
             
     #not using          graspi.tagged_objective(reg_obj,udp_locator),
     #not using          graspi.tagged_objective(reg_obj,ipip_locator))
@@ -173,11 +166,11 @@ graspi.init_bubble_text("BRSKI Join Registrar (flooding method)")
 graspi.tprint("Registrar starting now")
 
 ####################################
-# Start flooding thread
+# Flooding is done by the main loop,
+# not by a GRASP timer, because
+# flood() may block
 ####################################
 
-
-flooder().start()
 graspi.tprint("Flooding", reg_obj.name, "for ever")
         
 ###################################
@@ -196,11 +189,13 @@ graspi.tprint("Pretending to listen to ports", tcp_port,",", udp_port,
 
 # At a minimum, the main thread should keep an eye
 # on the other threads and restart them if needed.
-# For the demo, we just dump some diagnostic data...
+# For the demo, we just flood and dump some diagnostic data...
 
 while True:
     time.sleep(30)
     graspi.tprint("Registrar main loop diagnostic dump:")
     dump_some()
+    time.sleep(30)
+    flooder()
 
     
@@ -78,12 +78,12 @@ def dump_delegates():
 def dump_some():
     """Print obj_registry and flood cache"""
     grasp.tprint("Objective registry contents:")         
-    for x in grasp._obj_registry:
+    for x in grasp._obj_registry.values():
         o= x.objective
         grasp.tprint(o.name,"ASA:",x.asa_id,"Listen:",x.listening,"Neg:",o.neg,
                "Synch:",o.synch,"Count:",o.loop_count,"Value:",o.value)
     grasp.tprint("Flood cache contents:")            
-    for x in grasp._flood_cache:
+    for x in grasp._flood_cache.values():
         grasp.tprint(x.objective.name,"count:",x.objective.loop_count,"value:",
                      x.objective.value,"source",x.source)
     time.sleep(5)
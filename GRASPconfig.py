@@ -26,6 +26,8 @@ import json
 #  "grasp_version": 1,
 #  "max_multicast": 8192,
 #  "max_unicast": 5000,
+#  "max_flood_cache": 2000,
+#  "disc_hold_down": 2000,
 # }
 ###################################
 
@@ -41,6 +43,8 @@ class codepoints:
         self.grasp_version = 2
         self.max_multicast = 3
         self.max_unicast = 4
+        self.max_flood_cache = 5
+        self.disc_hold_down = 6
         self.test_only = 999
         
 cp = codepoints()
@@ -80,7 +80,7 @@
 ########################################################
 ########################################################"""
 
-_version = "RFC8990-BC-20260821"
+_version = "RFC8990-BC-20261018"
 
 ##########################################################
 # The following change log records significant changes,
@@ -254,6 +254,101 @@ _version = "RFC8990-BC-20260821"
 # 20260818 - added silent flag to skip_dialogue
 #
 # 20260821 - added figging flag to skip_dialogue
+#
+# 20261018 - discovery cache is an LRU ordered dictionary keyed
+#            by objective name, with a per-entry locator index
+#
+# 20261018 - session ID cache is a dictionary keyed by
+#            (id_value, id_source) with a queue of inactive entries
+#
+# 20261018 - flood cache is indexed by objective name and source,
+#            with expiry by heap instead of a sweep on every flood;
+#            flood cache limit is configurable via GraspConfig
+#
+# 20261018 - ASA and objective registries are dictionaries, replaced
+#            (copy-on-write) by writers so that readers need no lock
+#
+# 20261018 - added timer wheel and call_later()/call_every() to API,
+#            used instead of sleeping threads for delayed actions
+#
+# 20261018 - _recvraw() now finds the end of each CBOR message instead
+#            of waiting 0.2 s to see if more chunks arrive
+#
+# 20261018 - received TCP messages, and multicasts when QUADS is on,
+#            go into pooled buffers with recv_into() and are
+#            decrypted and decoded without further copying
+#
+# 20261018 - concurrent discover() calls for the same objective now
+#            share a single discovery session
+#
+# 20261018 - added min_results option to discover(), and added
+#            discover_iter() to API
+#
+# 20261018 - added negative discovery cache with hold-down and backoff
+#
+# 20261018 - added discovery_refresh() to API, for background refresh
+#            of frequently used discovery cache entries
+#
+# 20261018 - replaced the multicast, discovery response and request
+#            listener threads by a single selector-based reactor
+#            thread with a bounded worker pool; synch requests are
+#            answered by the worker pool too
+#
+# 20261018 - added sharing option to skip_dialogue(), for a single
+#            TCP request listener shared by all objectives
+#
+# 20261018 - accepted connections that send nothing are dropped after
+#            a deadline, with a cap on how many may wait; reads of a
+#            message have an overall deadline and a size limit
+#
+# 20261018 - added synch_keepalive() to API, for persistent
+#            synchronization connections in both directions
+#
+# 20261018 - added synch_cache() and synch_cache_stats() to API, for
+#            an optional cache of synchronize() results
+#
+# 20261018 - synch replies reuse the objective's CBOR encoding until
+#            its value changes; added update_value() to API
+#
+# 20261018 - discovery responses for local objectives are encoded once
+#            per objective, interface and version, and only the header
+#            is built per request
+#
+# 20261018 - split the multicast queue: floods go to _mchandler, which
+#            only updates the flood cache, and discovery responses are
+#            sent by a separate worker pool
+#
+# 20261018 - the discovery and flood queues use deficit round robin
+#            between sources, with priority for critical objectives
+#            and drop counters; added mc_drops() to API
+#
+# 20261018 - flood relays are sent by a scheduler thread with token
+#            buckets per interface and per originator, a bounded queue
+#            and coalescing of repeated floods
+#
+# 20261018 - relay loop detection and duplicate floods use dedicated
+#            time-bounded dedupe sets instead of the session cache
+#
+# 20261018 - relayed discoveries run in a bounded worker pool, are
+#            coalesced per objective, interface and loop count, and
+#            their results are forwarded to the originators as they
+#            arrive
+#
+# 20261018 - flood() and discover() encode each multicast once and
+#            send it with a single loop over the interfaces; a
+#            link-local locator is spliced in per interface
+#
+# 20261018 - added flood_batching() to API, to pack floods from
+#            all ASAs into as few M_FLOOD messages as possible
+#
+# 20261018 - flood relay limits per originator allow a busy node's
+#            periodic floods; added relay_drops() to API
+#
+# 20261018 - accepted connections are read by their own worker pool,
+#            with a read deadline of _halfOpenTimeout
+#
+# 20261018 - incoming multicasts from the same source are handled
+#            in arrival order, by a worker chosen by source address
 ##########################################################
 
 ####################################
@@ -278,7 +373,11 @@ def init(self):
                    'req_negotiate', 'negotiate_step', 'negotiate_wait',
                    'end_negotiate', 'listen_negotiate', 'stop_negotiate',
                    'synchronize', 'listen_synchronize', 'stop_synchronize',
-                   'flood', 'get_flood', 'expire_flood']
+                   'flood', 'get_flood', 'expire_flood',
+                   'call_later', 'call_every', 'discover_iter',
+                   'discovery_refresh', 'synch_keepalive',
+                   'synch_cache', 'synch_cache_stats', 'update_value',
+                   'mc_drops', 'flood_batching', 'relay_drops']
 
 ####################################
 #                                  #
@@ -298,6 +397,10 @@ import random
 import binascii
 import copy
 import traceback
+import collections
+import heapq
+import itertools
+import selectors
 ### for bubbles
 try:
     import tkinter as tk
@@ -379,8 +482,12 @@ class _asa_instance:
         self.handle = handle  #the ASA's handle
         self.name = name      #the ASA's name string
 
-# _asa_registry - list of _asa_instance
-# _asa_lock - lock for _asa_registry
+# _asa_registry - dict of _asa_instance keyed by name
+# _asa_handles  - dict of the same _asa_instance keyed by handle
+# _asa_lock - lock for updating _asa_registry and _asa_handles
+#
+# Both dicts are copy-on-write: writers build a new dict under
+# _asa_lock and then rebind the global, so readers never need the lock.
 
 ####################################
 # Objectives & registry            #
@@ -436,10 +543,16 @@ class _registered_objective:
         self.ttl = _discCacheDefTimeOut # discovery cache timeout in milliseconds
         self.listening = 0 # counts active listeners
         self.listen_q = None
+        self.synch_listen = False # True if synch requests answered by GRASP
+        self.version = 0 # bumped whenever the value is updated
+        self.encoded = None # (version, CBOR bytes of objective) for synch replies
         
 
-# _obj_registry - list of _registered_objective
-# _obj_lock - lock for _obj_registry
+# _obj_registry - dict of _registered_objective keyed by objective name
+# _obj_lock - lock for updating _obj_registry and its entries
+#
+# _obj_registry is copy-on-write like _asa_registry. Lookups need no
+# lock; changes to an entry's listening state are made under _obj_lock.
 
 
 
@@ -453,6 +566,10 @@ class _discovered_objective:
         self.objective = objective      
         self.asa_locators  = asa_locators #list of asa_locator
         self.received = None #objective received in M_RESPONSE
+        self.hits = 0        #cache hits since last refresh
+        #index of the same asa_locators by locator value,
+        #used for duplicate detection
+        self.locator_index = {x.locator: x for x in asa_locators}
 
 class asa_locator:
     """
@@ -486,9 +603,57 @@ Booleans:
         self.is_fqdn = False
         self.is_uri = False
         
-# _discovery_cache - list of _discovered_objective
+# _discovery_cache - OrderedDict of _discovered_objective, keyed by
+#                    objective name, in Least Recently Used order
 # _disc_lock - lock for _discovery_cache
 
+class _disc_flight:
+    """Internal use only"""
+    def __init__(self):
+        self.cond = threading.Condition() #notified per response and at end
+        self.done = False             #True when leader's discovery ends
+        self.responses = 0            #responses processed so far
+        self.answer = []              #leader's result
+        self.min_results = 0          #leader's min_results
+        self.followers = 0            #for diagnostics
+
+    def wait(self, name, min_results, timeout):
+        """Wait until done, or until the discovery cache holds
+        min_results locators for name (if min_results > 0)"""
+        def _enough():
+            return self.done or (min_results > 0 and
+                                 _disc_count(name) >= min_results)
+        self.cond.acquire()
+        self.cond.wait_for(_enough, timeout)
+        self.cond.release()
+
+    def notify(self, done=False):
+        """Wake up all waiters"""
+        self.cond.acquire()
+        if done:
+            self.done = True
+        else:
+            self.responses += 1
+        self.cond.notify_all()
+        self.cond.release()
+
+def _disc_count(name):
+    """Internal use only; number of locators cached for name"""
+    _disc_lock.acquire()
+    x = _discovery_cache.get(name)
+    n = 0
+    if x:
+        n = len(x.asa_locators)
+    _disc_lock.release()
+    return n
+
+# _disc_flights - dict of _disc_flight, keyed by objective name, for
+#                 discoveries in progress (also protected by _disc_lock)
+# _disc_negative - dict of [hold_until, hold_ms], keyed by objective name,
+#                  for objectives whose last discovery found nothing
+#                  (also protected by _disc_lock)
+# _disc_refresher - timer_handle for discovery refresh, None if off
+
 
 
 ####################################
@@ -511,8 +676,12 @@ class _session_handle:
         self.id_value = id_value   #Integer 
         self.id_source = id_source #Source locator of ID if non-local (packed)
 
-# _session_id_cache - list of _session_instance
-# _sess_lock - lock for _session_id_cache
+# _session_id_cache - dict of _session_instance keyed by (id_value, id_source)
+# _session_inactive - OrderedDict of keys of inactive sessions, oldest first
+#                     (the eviction queue for _session_id_cache)
+# _session_values   - Counter of id_values present in _session_id_cache
+#                     (for clash detection regardless of source)
+# _sess_lock - lock for all three
 
 # Session_ID cache contains
 #  - all currently active Session_IDs
@@ -534,8 +703,11 @@ An objective tagged with its source asa_locator:
         self.objective = objective
         self.source    = source # an asa_locator (including expiry time)
 
-# _flood_cache  - list of tagged_objective
-# _flood_lock - lock for _flood_cache
+# _flood_cache  - OrderedDict of tagged_objective keyed by
+#                 (name, source locator, source port), oldest first
+# _flood_index  - dict of {key: tagged_objective} keyed by name, for lookup
+# _flood_expiry - heap of [expire, seq, key, tagged_objective]
+# _flood_lock - lock for all three
 
 # Flood cache contains flooded objectives with their values and tagged
 # with their source address
@@ -610,7 +782,13 @@ _skip_dialogue = False     #true if ASA calls grasp.skip_dialogue
 # _crypto             #true if QUADS is secure
 # _secure             #true if either ACP or TLS or QUADS is secure
 # _rapid_supported    #true if rapid mode allowed
-# _mcq                #FIFO for incoming multicasts
+# _floodq             #fair queue for incoming flood multicasts
+# _discq              #fair queue for incoming discovery multicasts
+# _resp_workers       #worker pool draining _discq
+# _drops_by_source    #Counter of multicasts dropped from full queues
+# _drops_by_type      #Counter of the same by message type
+# _recv_pool          #pool of receive buffers
+# _cbor_views         #true if cbor.loads() accepts memoryview
 # _drq                #FIFO for pending discovery responses
 # _my_address         #this node's preferred global address
 # _my_link_local      #this node's preferred link local address
@@ -619,7 +797,20 @@ _skip_dialogue = False     #true if ASA calls grasp.skip_dialogue
 # _said_no_route      #flag used by watcher to limit printing
 # _mcssocks           #list of multicast sending sockets
 # _relay_needed       #True if multiple interfaces require Discovery/Flood relaying
+# _relayer            #flood relay scheduler thread, if relaying
+# _relayed            #dedupe set of relayed multicast sessions
+# _relay_workers      #worker pool for relayed discoveries, if relaying
+# _relay_flights      #originators of relayed discoveries in progress
+# _floods_seen        #dedupe set of received flood sessions
+# _flood_batch        #floods waiting to be sent together, if batching
 # _mc_restart         #True if system wakeup detected - multicast listeners must restart
+# _reactor            #the single reactor thread that waits on sockets
+# _workers            #the worker pool for the reactor
+# _readers            #worker pool reading accepted connections
+# _mc_workers         #workers handling LL multicasts, in order per source
+# _mc_sock            #the LL multicast listening socket
+# _mc_last            #time.monotonic() when a multicast last arrived
+# _drsocks            #dict of discovery response listening sockets by ifi
 # _i_sent_it          #session ID of most recent discovery multicast, used in a hack
 # _multi_asas         #flag used by ASA loader
 # test_mode           #True iff module is running in test mode
@@ -630,6 +821,7 @@ _skip_dialogue = False     #true if ASA calls grasp.skip_dialogue
 # _make_badmess       #True to throw a malformed message
 # _dobubbles          #True to enable bubble printing
 # _silent             #True to silence all output
+# _timer_wheel        #the single timer thread for delayed actions
 
 
 ####################################
@@ -674,6 +866,8 @@ GRASP_DEF_MAX_SIZE = 2048 # max message size
 
 _multicast_size = GRASP_DEF_MAX_SIZE
 _unicast_size = GRASP_DEF_MAX_SIZE
+_poolBufSize = 65536 # bytes per pooled receive buffer
+_poolBufCount = 16 # max idle buffers kept in pool
 
 _unspec_address = ipaddress.IPv6Address('::') # Used in special cases
                                               # to indicate link local
@@ -720,12 +914,45 @@ _sessionCacheLimit = _asaRegistryLimit + 1000
 _objRegistryLimit = 200
 _discCacheLimit = 500
 _discCacheDefTimeOut = 10*GRASP_DEF_TIMEOUT  # milliseconds
-_floodCacheLimit = 100
+_floodCacheLimit = 1000  # may be changed by GraspConfig
 _discQlimit = 10
 _listenQlimit = 5
 _multQlimit = 100
-_minRelayGap = 500      # milliseconds (unused, intended for relay throttling)
+_respWorkers = 4        # threads sending discovery responses
+_mcPriority = ("GraspConfig", "AN_ACP") # objectives whose multicasts jump the queues
+_minRelayGap = 20       # milliseconds (flood relay gap per originator)
+_relayRate = 50         # flood relays per second per interface
+_relayBurst = 4         # flood relays per interface allowed in a burst
+_relayOrigBurst = 100   # flood relays per originator allowed in a burst
+_relayQlimit = 1000     # flood relays waiting to be sent
+_relayWorkers = 8       # threads running relayed discoveries
+_relayDiscQlimit = 50   # relayed discoveries waiting for a thread
+_dedupeWindow = 2*GRASP_DEF_TIMEOUT # milliseconds (multicast duplicate detection)
+_dedupeMax = 100000     # session IDs remembered per half window
 _discTimeoutUnit = 100  # milliseconds (discovery timeout per hop)
+_discHoldDown = 5000    # milliseconds (initial negative discovery hold-down,
+                        #  0 = off, may be changed by GraspConfig)
+_discHoldMax = 60000    # milliseconds (maximum negative discovery hold-down)
+_discRefreshInterval = 1000 # milliseconds (discovery refresh check)
+_discRefreshLead = 10   # seconds (refresh discovery this long before expiry)
+_discRefreshHits = 2    # cache hits that make an objective worth refreshing
+_timerTick = 100        # milliseconds (timer wheel resolution)
+_wheelSlots = 64        # slots per level of timer wheel
+_floodReapInterval = 1000 # milliseconds (flood cache expiry check)
+_reactorWorkers = 8     # threads in worker pool
+_workQlimit = 1000      # jobs waiting for worker pool
+_readWorkers = 8        # threads reading accepted connections
+_mcWorkers = 8          # threads handling incoming multicasts
+_readQlimit = 64        # accepted connections waiting for a reader
+_mcIdle = 120           # seconds (multicast listener idle check)
+_halfOpenLimit = 64     # accepted connections waiting for first bytes
+_halfOpenTimeout = 5000 # milliseconds (wait for first bytes)
+_recvMaxSize = 1048576  # bytes (largest unicast message accepted)
+_synchIdle = 30000      # milliseconds (idle synch connection kept this long)
+_synchPoolMax = 4       # idle synch connections kept per peer
+_synchCacheLimit = 500  # entries in synchronize() result cache
+_mcDest = (str(ALL_GRASP_NEIGHBORS_6), GRASP_LISTEN_PORT) # multicast destination
+_floodBatchWindow = 100 # milliseconds (floods collected before a batch is sent)
 
 ####################################
 # List offsets for raw message     #
@@ -932,6 +1159,22 @@ def _decrypt_msg(crypt):
     unpadder = padding.PKCS7(128).unpadder()
     return unpadder.update(decryptor.update(crypt)) + unpadder.finalize()
 
+def _decrypt_into(crypt, out):
+    """Decrypts into bytearray out, returns memoryview of plaintext"""
+    decryptor = _cipher.decryptor()
+    n = decryptor.update_into(crypt, out)
+    decryptor.finalize()
+    #remove PKCS7 padding
+    if not n:
+        raise ValueError("Empty ciphertext")
+    pad = out[n-1]
+    if pad < 1 or pad > 16 or pad > n:
+        raise ValueError("Invalid padding bytes")
+    for i in range(n-pad, n-1):
+        if out[i] != pad:
+            raise ValueError("Invalid padding bytes")
+    return memoryview(out)[:n-pad]
+
 ####################################
 #                                  #
 # Registration functions           #
@@ -946,11 +1189,11 @@ def _decrypt_msg(crypt):
 
 def skip_dialogue(testing=False, selfing=False, diagnosing=True,
                   quadsing=True, be_dull=False, silent=False,
-                  figging=True):
+                  figging=True, sharing=False):
     """
 ####################################################################
 # skip_dialogue(testing=False, selfing=False, diagnosing=True,
-#               be_dull=False, silent=False)
+#               be_dull=False, silent=False, sharing=False)
 #                                  
 # A utility function that tells GRASP to skip some or all of its
 # initial dialogue. Each parameter may be True, False or the string "ask".
@@ -961,6 +1204,11 @@ def skip_dialogue(testing=False, selfing=False, diagnosing=True,
 # and not DULL
 # and not silent
 # and running Configger
+# and a separate TCP listening port per objective
+#
+# sharing=True makes all objectives share one TCP listening port,
+# with incoming requests sorted by objective name
+# (NOT part of the official API)
 # 
 # Must be called before register_asa()
 #
@@ -971,6 +1219,7 @@ def skip_dialogue(testing=False, selfing=False, diagnosing=True,
 """
     global _skip_dialogue, test_mode, _listen_self, _mess_check
     global _grasp_initialised, DULL, _be_dull, _silent, _figging
+    global _share_port
     if _grasp_initialised:
         return
     _skip_dialogue = True
@@ -980,6 +1229,7 @@ def skip_dialogue(testing=False, selfing=False, diagnosing=True,
     _be_dull = be_dull       #too early to set the actual DULL flag
     _silent = silent
     _figging = figging
+    _share_port = sharing
     
 
 
@@ -1003,20 +1253,25 @@ def register_asa(asa_name):
     if not _grasp_initialised:
         _initialise_grasp()
         
+    global _asa_registry, _asa_handles
     _asa_lock.acquire()
     if len(_asa_registry) >= _asaRegistryLimit:
         # no free space, fail
         _asa_lock.release()
         return errors.ASAfull, None
-    elif ([clash for clash in _asa_registry if clash.name == asa_name]):
+    elif asa_name in _asa_registry:
         # duplicate, fail
         _asa_lock.release()
         return errors.dupASA, None
     else:
-        #append new one
+        #add new one
         asa_handle = _new_session(None)
         new_asa = _asa_instance(asa_handle, asa_name)
-        _asa_registry.append(new_asa)
+        _new_reg = dict(_asa_registry)
+        _new_reg[asa_name] = new_asa
+        _new_handles = dict(_asa_handles)
+        _new_handles[asa_handle] = new_asa
+        _asa_registry, _asa_handles = _new_reg, _new_handles
         _asa_lock.release()
         return errors.ok, asa_handle
 
@@ -1039,10 +1294,13 @@ def deregister_asa(asa_handle, asa_name):
     # and remove all relevant data.
     # (Need this to happen automatically if ASA exits)
 
-    i = _retrieve_asa(asa_name)
-    if i == -1:
+    global _asa_registry, _asa_handles, _obj_registry
+    _asa_lock.acquire()
+    x = _asa_registry.get(asa_name)
+    if not x:
+        _asa_lock.release()
         return errors.noASA
-    elif (_asa_registry[i].handle != asa_handle):
+    elif (x.handle != asa_handle):
         _asa_lock.release()
         return errors.notYourASA
     else:
@@ -1052,22 +1310,21 @@ def deregister_asa(asa_handle, asa_name):
         # We have to keep the ASA lock for the whole time!
 
         _obj_lock.acquire()
-        # The following loop looks unPythonesque, because
-        # it shortens the list that it's looping over, so
-        # it has to be done the old-fashioned way.
-        j=0
-        while j < len(_obj_registry):
-            x = _obj_registry[j]
+        _new_reg = dict(_obj_registry)
+        for x in _obj_registry.values():
             if asa_handle in x.asa_id:
                 x.asa_id.remove(asa_handle)
                 if x.asa_id == []:
-                    #last one - delete it, which shortens the list
-                    del _obj_registry[j]
-            else:
-                j += 1
+                    #last one - delete it
+                    del _new_reg[x.objective.name]
+        _obj_registry = _new_reg
         _obj_lock.release()
         
-        del _asa_registry[i]
+        _new_reg = dict(_asa_registry)
+        del _new_reg[asa_name]
+        _new_handles = dict(_asa_handles)
+        del _new_handles[asa_handle]
+        _asa_registry, _asa_handles = _new_reg, _new_handles
         #mark the handle as inactive
         _update_session(_session_instance(asa_handle,False,None))
         _asa_lock.release()
@@ -1129,35 +1386,38 @@ def register_obj(asa_handle, obj, ttl=None, discoverable=False, \
     obj=_oclone(obj)
 
     #Search the registry to detect any duplicate
+    global _obj_registry
     _obj_lock.acquire()
     if len(_obj_registry) >= _objRegistryLimit:
         # no free space, fail
         _obj_lock.release()
         return errors.objFull
 
-    for clash in _obj_registry:
-        if clash.objective.name == obj.name:
-            if clash.overlap_OK and overlap:
-                # allowed overlap
-                ttprint("Overlapping for", obj.name)
-                clash.asa_id.append(asa_handle)
-                _obj_lock.release()
-                return errors.ok
-            else:
-                # disallowed overlap, fail
-                _obj_lock.release()
-                return errors.objReg
+    clash = _obj_registry.get(obj.name)
+    if clash:
+        if clash.overlap_OK and overlap:
+            # allowed overlap
+            ttprint("Overlapping for", obj.name)
+            clash.asa_id.append(asa_handle)
+            _obj_lock.release()
+            return errors.ok
+        else:
+            # disallowed overlap, fail
+            _obj_lock.release()
+            return errors.objReg
             
-    #not previously registered, start a listener thread if needed
-    if obj.neg or obj.synch or obj.dry:
+    #not previously registered, start a listener if needed
+    if (obj.neg or obj.synch or obj.dry) and _shared_sock:
+        listen_port = _shared_sock.getsockname()[1]
+    elif obj.neg or obj.synch or obj.dry:
         listen_sock=socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
         listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         listen_sock.bind(('',0))
         listen_port = listen_sock.getsockname()[1]
-        _tcp_listen(listen_sock).start()
+        _tcp_listen(listen_sock)
     else:
         listen_port = 0
-    #append new one
+    #add new one
     new_obj = _registered_objective(obj, asa_handle)
     new_obj.overlap_OK = overlap
     new_obj.port = listen_port
@@ -1167,7 +1427,10 @@ def register_obj(asa_handle, obj, ttl=None, discoverable=False, \
     new_obj.locators = locators
     if tname(ttl) == "int" and ttl>0:
         new_obj.ttl = ttl
-    _obj_registry.append(new_obj)
+    _new_reg = dict(_obj_registry)
+    _new_reg[obj.name] = new_obj
+    _obj_registry = _new_reg
+    _clear_responses()
     _obj_lock.release()
     return errors.ok
     
@@ -1189,23 +1452,24 @@ def deregister_obj(asa_handle, obj):
 
     if _no_handle(asa_handle):
         return errors.noASA
+    global _obj_registry
     _obj_lock.acquire()
-    # Can't use a comprehension because we need the actual
-    # list entry in order to delete it.
-    for i in range(len(_obj_registry)):
-        x =_obj_registry[i]
-        if x.objective.name == obj.name:
-            #found it
-            if asa_handle not in x.asa_id:
-                _obj_lock.release()
-                return errors.notYourObj
-            #deregister the ASA from the objective
-            x.asa_id.remove(asa_handle)
-            if x.asa_id == []:
-                #last one - delete it, which shortens the list
-                del _obj_registry[i]            
+    x = _obj_registry.get(obj.name)
+    if x:
+        #found it
+        if asa_handle not in x.asa_id:
             _obj_lock.release()
-            return errors.ok
+            return errors.notYourObj
+        #deregister the ASA from the objective
+        x.asa_id.remove(asa_handle)
+        if x.asa_id == []:
+            #last one - delete it
+            _new_reg = dict(_obj_registry)
+            del _new_reg[obj.name]
+            _obj_registry = _new_reg
+            _clear_responses()
+        _obj_lock.release()
+        return errors.ok
     _obj_lock.release()
     return errors.notObj
 
@@ -1217,38 +1481,272 @@ def deregister_obj(asa_handle, obj):
 #                                  #
 ####################################
 
+class _buffer_pool:
+    """Internal use only"""
+####################################################
+# Pool of receive buffers, so that steady state    #
+# reception reuses the same few bytearrays instead #
+# of allocating a new bytes object per message.    #
+####################################################
+    def __init__(self, size, count):
+        self.size = size
+        self.count = count
+        self.free = collections.deque() #append() and pop() are atomic
+        self.allocated = 0              #for diagnostics
+
+    def get(self):
+        """Take a buffer from the pool, or make a new one"""
+        try:
+            return self.free.pop()
+        except IndexError:
+            self.allocated += 1
+            return bytearray(self.size)
+
+    def put(self, buf):
+        """Return a buffer to the pool"""
+        if len(buf) == self.size and len(self.free) < self.count:
+            self.free.append(buf)
+
+def _free_raw(raw):
+    """Internal use only; returns the buffer behind raw to the pool"""
+    if isinstance(raw, memoryview):
+        buf = raw.obj
+        raw.release()
+        _recv_pool.put(buf)
+
+def _decode_raw(raw):
+    """Internal use only"""
+####################################################
+# Decrypt and CBOR-decode a received message held  #
+# in a memoryview from _recvraw() or _recv_mc(),   #
+# or in bytes, then return any buffers to the pool.#
+#                                                  #
+# return: the decoded payload                      #
+# raise an exception if it won't decode            #
+####################################################
+    out = None
+    plain = raw
+    try:
+        if _crypto:
+            out = _recv_pool.get()
+            if len(out) < len(raw) + 15:
+                out = bytearray(len(raw) + 15)
+            plain = _decrypt_into(raw, out)
+        if not _cbor_views and isinstance(plain, memoryview):
+            return cbor.loads(bytes(plain)) #old cbor library needs bytes
+        return cbor.loads(plain)
+    finally:
+        if out:
+            if plain is not raw: #decryption may have failed
+                plain.release()
+            _recv_pool.put(out)
+        _free_raw(raw)
+
+def _recv_mc(sock):
+    """Internal use only"""
+####################################################
+# Receive one multicast for _mc_readable()         #
+#                                                  #
+# With QUADS, receive into a pooled buffer and let #
+# _decode_raw() decrypt into another, so nothing   #
+# is allocated per packet but the decoded payload. #
+# Without QUADS, plain recvfrom() is cheaper: the  #
+# CBOR decoder copies a memoryview but can use a   #
+# bytes object as it is.                           #
+#                                                  #
+# return: message (memoryview or bytes), sender    #
+####################################################
+    if _crypto:
+        buf = _recv_pool.get()
+        try:
+            n, send_addr = sock.recvfrom_into(buf, _multicast_size)
+        except OSError:
+            _recv_pool.put(buf) #usually nothing more to read
+            raise
+        return memoryview(buf)[:n], send_addr
+    return sock.recvfrom(_multicast_size)
+
+def _cbor_end(buf, state=None):
+    """Internal use only"""
+####################################################
+# Find the end of the CBOR item at the start of    #
+# buf by walking its headers, without decoding it. #
+#                                                  #
+# state, if given, is a list [pos, todo, stack]    #
+# kept by the caller. It starts as [0, 1, []] and  #
+# is updated when buf holds only part of an item,  #
+# so that a later call with more bytes carries on  #
+# from there instead of from the start.            #
+#                                                  #
+# return: length of the item, or None if buf holds #
+#         only part of an item                     #
+# raise ValueError if buf is not valid CBOR        #
+####################################################
+    if state == None:
+        state = [0, 1, []]
+    pos, todo, stack = state #todo: items still needed at this level,
+                             #-1 if indefinite; stack: todo counts
+                             #of enclosing levels
+    n = len(buf)
+    while True:
+        if pos > n:
+            break #inside a string
+        while todo == 0:
+            if not stack:
+                return pos
+            todo = stack.pop()
+        if pos >= n:
+            break
+        ib = buf[pos]
+        if ib == 0xff:
+            #break code ends an indefinite length item
+            if todo != -1:
+                raise ValueError("Unexpected CBOR break")
+            todo = 0
+            pos += 1
+            continue
+        mt = ib >> 5
+        ai = ib & 0x1f
+        if ai < 24:
+            val = ai
+            pos += 1
+        elif ai < 28:
+            size = 1 << (ai - 24)
+            if pos + 1 + size > n:
+                break #header not all here yet
+            val = int.from_bytes(buf[pos+1:pos+1+size], 'big')
+            pos += 1 + size
+        elif ai == 31 and mt in (2, 3, 4, 5):
+            val = None
+            pos += 1
+        else:
+            raise ValueError("Invalid CBOR header")
+        if todo > 0:
+            todo -= 1
+        if mt == 2 or mt == 3:
+            #byte or text string
+            if val == None:
+                stack.append(todo)
+                todo = -1
+            else:
+                pos += val
+        elif mt == 4 or mt == 5:
+            #array or map
+            if val == None:
+                stack.append(todo)
+                todo = -1
+            elif val:
+                stack.append(todo)
+                todo = val * (mt - 3)
+        elif mt == 6:
+            #tag applies to the next item
+            stack.append(todo)
+            todo = 1
+    state[0] = pos
+    state[1] = todo
+    return None
+
+class _msg_scanner:
+    """Internal use only"""
+####################################################
+# Check whether a GRASP message arriving in chunks #
+# is complete, looking only at the bytes that are  #
+# new since the last check. With QUADS they are    #
+# decrypted by a running CBC decryptor, and the    #
+# CBOR walk carries on where it stopped, so the    #
+# work is linear in the message size.              #
+#                                                  #
+# Malformed input counts as complete since waiting #
+# for more will not help.                          #
+####################################################
+    def __init__(self):
+        self.state = [0, 1, []] #for _cbor_end()
+        self.end = None         #length of the CBOR item, once found
+        if _crypto:
+            self.decryptor = _cipher.decryptor()
+            self.plain = bytearray()
+            self.seen = 0       #bytes already decrypted
+
+    def complete(self, raw):
+        """True if raw (all the bytes so far) is a whole message"""
+        if _crypto:
+            self.plain += self.decryptor.update(raw[self.seen:])
+            self.seen = len(raw)
+            text = self.plain
+        else:
+            text = raw
+        if self.end == None:
+            try:
+                self.end = _cbor_end(text, self.state)
+            except ValueError:
+                return True
+            if self.end == None:
+                return False
+        if _crypto:
+            #the padding must be there too
+            return len(raw) % 16 == 0 and len(raw) > self.end
+        return True
+
 def _recvraw(sock):
     """Internal use only"""
-    rawmsg, send_addr = sock.recvfrom(_unicast_size)
-    if len(rawmsg) > 1200: # close to minimum IPv6 MTU
-        #need to check for more chunks
-        ttprint("First chunk length",len(rawmsg),"; waiting for more")
+####################################################
+# Receive one GRASP message from a TCP socket into #
+# a pooled buffer.                                 #
+#                                                  #
+# A large message may arrive in several chunks, so #
+# keep reading until a complete CBOR item is held. #
+# Stop early if the peer closes the connection,    #
+# the read deadline passes (the socket timeout, or #
+# GRASP_DEF_TIMEOUT if none) or the message grows  #
+# beyond _recvMaxSize, and leave the caller to     #
+# reject any incomplete message.                   #
+#                                                  #
+# return: memoryview of the message (b'' if none), #
+#         sender's address                         #
+#                                                  #
+# Pass the memoryview to _decode_raw() or          #
+# _free_raw() when finished with it.               #
+####################################################
+    buf = _recv_pool.get()
+    n, send_addr = sock.recvfrom_into(buf, _unicast_size)
+    if not n:
+        _recv_pool.put(buf)
+        return b'', send_addr
+    scan = _msg_scanner()
+    if not scan.complete(memoryview(buf)[:n]):
+        ttprint("First chunk length",n,"; waiting for more")
         _to = sock.gettimeout()
-        sock.settimeout(0.2)
-        while True:
-            try:
-                raw2, _ = sock.recvfrom(_unicast_size)
-                if len(raw2):
-                    rawmsg += raw2
-                else:
-                    break #no more bytes
-            except:
-                break #timeout, assume there's nothing more
+        if _to == None:
+            _deadline = time.monotonic() + GRASP_DEF_TIMEOUT/1000
+        else:
+            _deadline = time.monotonic() + _to
+        try:
+            while True:
+                #a slow peer must not hold on for ever
+                _left = _deadline - time.monotonic()
+                if _left <= 0:
+                    ttprint("Read deadline passed after",n,"bytes")
+                    break
+                sock.settimeout(_left)
+                if n == len(buf):
+                    #message is bigger than buffer
+                    if n >= _recvMaxSize:
+                        tprint("Message exceeds",_recvMaxSize,"bytes: truncated")
+                        break
+                    buf2 = bytearray(2*len(buf))
+                    buf2[:n] = buf
+                    _recv_pool.put(buf)
+                    buf = buf2
+                k = sock.recv_into(memoryview(buf)[n:])
+                if not k:
+                    break #peer closed
+                n += k
+                if scan.complete(memoryview(buf)[:n]):
+                    break
+        except OSError:
+            pass #timeout, return what we have
         sock.settimeout(_to)
-
-##        #need to check briefly for a second chunk
-##        ttprint("Raw chunk length",len(rawmsg),"; waiting for more")
-##        _to = sock.gettimeout()
-##        sock.settimeout(0.2)
-##        try:
-##            raw2, _ = sock.recvfrom(GRASP_DEF_MAX_SIZE)
-##            if len(raw2):
-##                rawmsg += raw2
-##        except:
-##            pass #timeout, assume there's nothing more
-##        sock.settimeout(_to)        
-        
-    return rawmsg, send_addr
+    return memoryview(buf)[:n], send_addr
 
 ####################################
 #                                  #
@@ -1259,7 +1757,7 @@ def _recvraw(sock):
 
 
 def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
-             relay_ifi=False, relay_shandle=None):
+             relay_ifi=False, relay_shandle=None, min_results=0):
     """
 ############################################################## 
 # discover(asa_handle, objective, timeout)
@@ -1271,7 +1769,24 @@ def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
 # If not, results will be collected until the timeout occurs.
 #
 # Optional parameter flush=True will flush all cached results first
+#  (and ignore any hold-down, see below)
 # Optional parameter minimum_TTL will flush stale cached results first
+# Optional parameter min_results=N returns as soon as N locators
+#  have been discovered, instead of waiting for the timeout;
+#  min_results=1 returns on the first response. Responses that
+#  arrive later are not cached.
+#
+# If another thread is already discovering the same objective,
+# no new discovery is started; the caller waits for that one
+# (but no longer than its own timeout) and gets the same results.
+# If that one stopped early because of a smaller min_results,
+# the caller carries on with a discovery of its own for the
+# rest of its timeout.
+#
+# If a discovery finds nothing, the objective is held down:
+# further calls return [] at once, without asking the network,
+# for a hold-down time that starts at a few seconds and doubles
+# after each failed discovery, up to a minute.
 #
 # Other optional parameters are for GRASP internal use only
 #
@@ -1281,7 +1796,6 @@ def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
 # Exponential backoff RECOMMENDED before retry.
 ##############################################################
 """
-    global _i_sent_it
     if not relay_ifi:
         if not _secure and not DULL:
             return errors.noSecurity, [] #allowed in DULL mode
@@ -1293,6 +1807,60 @@ def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
     if DULL:
         obj.loop_count = 1
 
+    _found = _disc_cached(obj, flush, minimum_TTL, relay_ifi)
+    if _found:
+        return errors.ok, _found
+
+    # Not already discovered (or flushed)
+
+    if relay_ifi:
+        return _disc_session(obj, timeout, relay_ifi, relay_shandle)
+
+    if not flush and _disc_held(obj.name):
+        ttprint("Discovery of", obj.name, "held down")
+        return errors.ok, []
+
+    # Join a discovery in progress if there is one, else start one
+
+    if not timeout:
+        timeout = _discTimeoutUnit*obj.loop_count
+    et = time.monotonic() + timeout/1000
+    flight, leader = _disc_join(obj.name)
+    while not leader:
+        ttprint("Joining discovery in progress for", obj.name)
+        flight.wait(obj.name, min_results, et - time.monotonic())
+        if not flight.done:
+            break
+        # the leader's answer will do unless it stopped early,
+        # with fewer results than this caller wants
+        _early = flight.min_results > 0 and \
+                 len(flight.answer) >= flight.min_results
+        if not _early or 0 < min_results <= flight.min_results:
+            return errors.ok, copy.deepcopy(flight.answer)
+        if et - time.monotonic() <= 0:
+            break
+        # carry on in a new discovery for the time left
+        timeout = int((et - time.monotonic())*1000) + 1
+        flight, leader = _disc_join(obj.name)
+    if not leader:
+        # timed out, return whatever has arrived so far
+        _disc_lock.acquire()
+        x = _discovery_cache.get(obj.name)
+        if x:
+            _found = copy.deepcopy(x.asa_locators)
+        else:
+            _found = []
+        _disc_lock.release()
+        return errors.ok, _found
+    return _disc_lead(obj, timeout, flight, min_results)
+
+def _disc_cached(obj, flush, minimum_TTL, relay_ifi):
+    """Internal use only"""
+##################################
+# internal function for discover()
+# returns a copy of the unexpired
+# cached locators for obj, or []
+##################################
     if minimum_TTL > 0:
         #user's expiry deadline
         _exdl = int(time.monotonic()) + minimum_TTL/1000
@@ -1301,56 +1869,201 @@ def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
         _exdl = int(time.monotonic())        
 
     _disc_lock.acquire()
-    # Can't use a comprehension because we need the actual
-    # list entry in order to delete it.
-    for i in range(len(_discovery_cache)):
-        x = _discovery_cache[i]
-        if x.objective.name == obj.name:
-            del(_discovery_cache[i])
-            if flush or (minimum_TTL == 0):
-                ttprint("Discover flushing",obj.name)
-                break
-            else:
-                _discovery_cache.append(x)   #make it Most Recently Used
-                if not _test_divert:
-                    # delete any expired locators
-                    j = 0
-                    while len(x.asa_locators) > j:
-                        _ex = x.asa_locators[j].expire
-                        ttprint("Discovery expiry data:",obj.name,_ex, int(time.monotonic()))
-                        if _ex and (_ex < _exdl):
-                            ttprint("Deleting stale discovery",j)
-                            del x.asa_locators[j]
-                        else:
-                            j += 1
-                       
-                    # is there anything to return?                
-                    if len(x.asa_locators) > 0:
-                        _found = copy.deepcopy(x.asa_locators)
-                        _disc_lock.release()
-                        
-                        # 20220429 - ignore cache entries discovered on same interface 
-                        # (RFC8990 section 2.5.4.3 2nd paragraph, last sentence)
-                        
-                        if relay_ifi:
-                            j = 0
-                            while len(_found) > j:
-                                if _found[j].ifi == relay_ifi:
-                                    # Remove the entry
-                                    ttprint("Ignoring LL discovery result", _found[j].locator)
-                                    del _found[j]
-                                else:
-                                    j += 1
-                        
-                        if len(_found) > 0:
-                            return errors.ok, _found                            
+    x = _discovery_cache.get(obj.name)
+    if x:
+        if flush or (minimum_TTL == 0):
+            ttprint("Discover flushing",obj.name)
+            del _discovery_cache[obj.name]
+        else:
+            _discovery_cache.move_to_end(obj.name)   #make it Most Recently Used
+            if not _test_divert:
+                # delete any expired locators
+                j = 0
+                while len(x.asa_locators) > j:
+                    _ex = x.asa_locators[j].expire
+                    ttprint("Discovery expiry data:",obj.name,_ex, int(time.monotonic()))
+                    if _ex and (_ex < _exdl):
+                        ttprint("Deleting stale discovery",j)
+                        x.locator_index.pop(x.asa_locators[j].locator, None)
+                        del x.asa_locators[j]
+                    else:
+                        j += 1
+                   
+                # is there anything to return?                
+                if len(x.asa_locators) > 0:
+                    x.hits += 1
+                    _found = copy.deepcopy(x.asa_locators)
+                    _disc_lock.release()
+                    
+                    # 20220429 - ignore cache entries discovered on same interface 
+                    # (RFC8990 section 2.5.4.3 2nd paragraph, last sentence)
+                    
+                    if relay_ifi:
+                        j = 0
+                        while len(_found) > j:
+                            if _found[j].ifi == relay_ifi:
+                                # Remove the entry
+                                ttprint("Ignoring LL discovery result", _found[j].locator)
+                                del _found[j]
+                            else:
+                                j += 1
+                    
+                    if len(_found) > 0:
+                        return _found
+                    _disc_lock.acquire()
+    _disc_lock.release()
+    return []
+
+def _disc_held(name):
+    """Internal use only; True if name is in negative hold-down"""
+    _disc_lock.acquire()
+    x = _disc_negative.get(name)
+    _held = bool(x) and x[0] > time.monotonic()
+    _disc_lock.release()
+    return _held
+
+def _disc_join(name):
+    """Internal use only"""
+##################################
+# internal function for discover()
+# returns the discovery in progress
+# for name and False, or else a new
+# one and True (caller must lead it)
+##################################
+    _disc_lock.acquire()
+    flight = _disc_flights.get(name)
+    if flight:
+        flight.followers += 1
+        _disc_lock.release()
+        return flight, False
+    flight = _disc_flight()
+    _disc_flights[name] = flight
+    _disc_lock.release()
+    return flight, True
+
+def _disc_lead(obj, timeout, flight, min_results):
+    """Internal use only"""
+##################################
+# internal function for discover()
+# runs the discovery session for a
+# _disc_flight and then wakes up
+# everyone waiting for it
+##################################
+    err = errors.ok
+    flight.min_results = min_results
     try:
+        err, flight.answer = _disc_session(obj, timeout, False, None,
+                                           flight, min_results)
+    finally:
+        _disc_lock.acquire()
+        del _disc_flights[obj.name]
+        if not flight.answer and _discHoldDown:
+            #nothing found, hold down with exponential backoff
+            x = _disc_negative.get(obj.name)
+            if x:
+                _hold = min(2*x[1], _discHoldMax)
+            else:
+                _hold = _discHoldDown
+            _disc_negative[obj.name] = [time.monotonic() + _hold/1000, _hold]
+            ttprint("Holding down discovery of", obj.name, "for", _hold, "ms")
         _disc_lock.release()
-    except:
-        pass
+        if flight.followers:
+            ttprint("Discovery of", obj.name, "shared with",
+                    flight.followers, "other caller(s)")
+        flight.notify(done=True)
+    return err, flight.answer
 
-    # Not already discovered (or flushed), launch discovery session
+def discover_iter(asa_handle, obj, timeout, flush=False, minimum_TTL=-1):
+    """
+############################################################## 
+# discover_iter(asa_handle, objective, timeout)
+#
+# (NOT part of the official API)
+#
+# Like discover(), but returns an iterator that yields each
+# asa_locator as soon as its discovery response has been
+# processed, instead of a list when the timeout expires:
+#
+#   err, locs = discover_iter(asa_handle, obj, timeout)
+#   for loc in locs:
+#       ...
+#
+# Cached results are yielded at once. The caller may stop
+# iterating whenever it likes; the discovery session still
+# runs until the timeout so that the cache is filled.
+#
+# Parameters are as for discover()
+#
+# return zero, iterator of asa_locator if successful
+# return errorcode, empty iterator if failure
+##############################################################
+"""
+    if not _secure and not DULL:
+        return errors.noSecurity, iter([])
+    errorcode = _check_asa_obj(asa_handle, obj, False)
+    if errorcode:
+        return errorcode, iter([])
+    if DULL:
+        obj.loop_count = 1
+    if not timeout:
+        timeout = _discTimeoutUnit*obj.loop_count
+    return errors.ok, _disc_iter(obj, timeout, flush, minimum_TTL)
 
+def _disc_iter(obj, timeout, flush, minimum_TTL):
+    """Internal use only"""
+##################################
+# generator for discover_iter()
+##################################
+    _found = _disc_cached(obj, flush, minimum_TTL, False)
+    if _found:
+        yield from _found
+        return
+    if not flush and _disc_held(obj.name):
+        return
+    et = time.monotonic() + timeout/1000
+    flight, leader = _disc_join(obj.name)
+    if leader:
+        #run the session in another thread so that we can
+        #yield results as they arrive
+        threading.Thread(target=_disc_lead, args=(obj, timeout, flight, 0),
+                         daemon=True).start()
+    seen = set()
+    while True:
+        flight.cond.acquire()
+        done = flight.done
+        count = flight.responses
+        flight.cond.release()
+        #yield anything new in the cache
+        _disc_lock.acquire()
+        x = _discovery_cache.get(obj.name)
+        _new = []
+        if x:
+            _new = [copy.deepcopy(a) for a in x.asa_locators
+                    if not a.locator in seen]
+        _disc_lock.release()
+        for aloc in _new:
+            seen.add(aloc.locator)
+            yield aloc
+        tleft = et - time.monotonic()
+        if done or tleft <= 0:
+            return
+        #wait for the next response
+        flight.cond.acquire()
+        flight.cond.wait_for(lambda: flight.done or flight.responses != count,
+                             tleft)
+        flight.cond.release()
+
+def _disc_session(obj, timeout, relay_ifi, relay_shandle,
+                  flight=None, min_results=0):
+    """Internal use only"""
+##################################
+# internal function for discover()
+# launches a discovery session and
+# collects responses until timeout
+# or until min_results locators
+# are cached (if min_results > 0)
+##################################
+    global _i_sent_it
     if not relay_ifi:
         disc_sess = _new_session(_session_locator)
         shandle=_session_handle(disc_sess,_session_locator.packed)
@@ -1392,18 +2105,7 @@ def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
     msg_bytes = _ass_message(M_DISCOVERY, disc_sess, _sloc, obj)
     
     # Send it on all interfaces (except the source when relaying)
-       
-    # Can't use a comprehension because we need the actual
-    # list index in order select the correct socket.
-    for i in range(len(_ll_zone_ids)):
-        if _ll_zone_ids[i][0] != relay_ifi:
-            ttprint("Sending discovery on interface", _ll_zone_ids[i][0])
-            try:
-                _mcssocks[i][1].sendto(msg_bytes,0,(str(ALL_GRASP_NEIGHBORS_6), GRASP_LISTEN_PORT))  
-            except:
-                #might fail if CPU suspended etc
-                tprint("MC socket failure in discover()")
-                _fixmcsock(i)
+    _mc_send(msg_bytes, "discover()", relay_ifi)
                        
     # Note that listening threads for these sockets
     # were started during GRASP initialisation
@@ -1430,6 +2132,14 @@ def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
                 #it belongs here
                 #strip it down to an option list and process it                
                 _drloop(dr[1], msg.ttl, msg.options, msg.obj, obj, False)
+                if flight:
+                    flight.notify() #for followers and discover_iter()
+                if relay_ifi:
+                    #don't keep the originator(s) waiting
+                    _relay_forward((obj.name, relay_ifi, obj.loop_count))
+                if min_results > 0 and _disc_count(obj.name) >= min_results:
+                    ttprint("Discovery has", min_results, "result(s)")
+                    break
             else:
                 #response reached wrong queue
                 tprint("Discovery response to wrong session")
@@ -1442,13 +2152,13 @@ def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
     
     #extract results from discovery cache
     _disc_lock.acquire()
-    for x in _discovery_cache:
-        if x.objective.name == obj.name:
-            answer = x.asa_locators
-            _disc_lock.release()
-            _disactivate_session(shandle)
-            del _drq #garbage collect
-            return errors.ok, answer
+    x = _discovery_cache.get(obj.name)
+    if x:
+        answer = x.asa_locators
+        _disc_lock.release()
+        _disactivate_session(shandle)
+        del _drq #garbage collect
+        return errors.ok, answer
     _disc_lock.release()
         
     #no reply, return empty list
@@ -1460,6 +2170,63 @@ def discover(asa_handle, obj, timeout, flush=False, minimum_TTL=-1,
 
 
 
+def discovery_refresh(enable=True):
+    """
+############################################################## 
+# discovery_refresh(enable)
+#
+# (NOT part of the official API)
+#
+# Turns background refresh of the discovery cache on or off.
+# It is off by default.
+#
+# When it is on, an objective that discover() has found in the
+# cache at least twice since it was last refreshed is discovered
+# again in the background shortly before its locators expire.
+# Meanwhile discover() keeps returning the locators that are
+# still valid, so an ASA that discovers the same objective
+# repeatedly need not block in steady state.
+#
+# No return value
+##############################################################
+"""
+    global _disc_refresher
+    _disc_lock.acquire()
+    if enable and not _disc_refresher:
+        _disc_refresher = call_every(_discRefreshInterval, _disc_refresh)
+    elif not enable and _disc_refresher:
+        _disc_refresher.cancel()
+        _disc_refresher = None
+    _disc_lock.release()
+
+def _disc_refresh():
+    """Internal use only"""
+##################################
+# timer action for discovery_refresh()
+# starts a background discovery for
+# each frequently used cache entry
+# that is about to expire
+##################################
+    _now = time.monotonic()
+    _due = []
+    _disc_lock.acquire()
+    for x in _discovery_cache.values():
+        if x.hits < _discRefreshHits or x.objective.name in _disc_flights:
+            continue
+        _ex = [a.expire for a in x.asa_locators if a.expire]
+        if _ex and min(_ex) - _now < _discRefreshLead:
+            x.hits = 0
+            _due.append(x.objective)
+    _disc_lock.release()
+    for obj in _due:
+        flight, leader = _disc_join(obj.name)
+        if leader:
+            ttprint("Refreshing discovery of", obj.name)
+            threading.Thread(target=_disc_lead,
+                             args=(obj, _discTimeoutUnit*obj.loop_count,
+                                   flight, 0),
+                             daemon=True).start()
+
 def _drloop(ifi,ttl,options,rec_obj,obj,inDivert):
     """Internal use only"""
 ##################################
@@ -1490,35 +2257,33 @@ def _drloop(ifi,ttl,options,rec_obj,obj,inDivert):
             aloc.protocol = opti.protocol
             aloc.port = opti.port
             aloc.expire = int(time.monotonic() + ttl/1000)
-            _found = False
             _disc_lock.acquire()
-            for x in _discovery_cache:
-                if x.objective.name == obj.name:
-                    ttprint("Adding locator to discovery cache for",obj.name)
-                    #20220316 - add check for duplicate
-                    _duplicate = False
-                    for existing in x.asa_locators:
-                        if aloc.locator == existing.locator:
-                            #same answer already in cache
-                            _duplicate = True
-                            ttprint("Found duplicate locator in discovery cache for",obj.name)
-                            if aloc.expire > existing.expire:
-                                #fresher reply, prefer it
-                                existing.expire = aloc.expire
-                    if not _duplicate:
-                        x.asa_locators.append(aloc)
-                    x.received = rec_obj #always prefer latest value
-                    _found = True
-                    break
-            if not _found:
+            _disc_negative.pop(obj.name, None) #no longer undiscoverable
+            x = _discovery_cache.get(obj.name)
+            if x:
+                ttprint("Adding locator to discovery cache for",obj.name)
+                _discovery_cache.move_to_end(obj.name) #make it Most Recently Used
+                #20220316 - add check for duplicate
+                existing = x.locator_index.get(aloc.locator)
+                if existing:
+                    #same answer already in cache
+                    ttprint("Found duplicate locator in discovery cache for",obj.name)
+                    if aloc.expire > existing.expire:
+                        #fresher reply, prefer it
+                        existing.expire = aloc.expire
+                else:
+                    x.asa_locators.append(aloc)
+                    x.locator_index[aloc.locator] = aloc
+                x.received = rec_obj #always prefer latest value
+            else:
                 ttprint("Adding objective to discovery cache")
                 #add entry to discovery cache
                 #but first, check length and garbage collect
                 if len(_discovery_cache) >= _discCacheLimit:
-                    del(_discovery_cache[0]) #delete Least Recently Used
+                    _discovery_cache.popitem(last=False) #delete Least Recently Used
                 _new_do = _discovered_objective(obj,[aloc])
                 _new_do.received = rec_obj
-                _discovery_cache.append(_new_do)
+                _discovery_cache[obj.name] = _new_do
             _disc_lock.release()
 
 
@@ -1596,7 +2361,7 @@ def req_negotiate(asa_handle, obj, peer, timeout, noloop=False):
 
     if peer == None:
         #Caller did not supply locator, we can try discovery
-        _, ll = discover(asa_handle, obj, timeout)
+        _, ll = discover(asa_handle, obj, timeout, min_results=1)
         if len(ll)==0:
             return errors.noDiscReply, None, None
         else:
@@ -1755,9 +2520,9 @@ def _negloop(shandle, obj, timeout, sock, new_request):
                 _disactivate_session(shandle)
                 return errors.noPeer, None, None
                     
-            ttprint("negloop: raw reply:", rawmsg,"bytecount",len(rawmsg))
+            ttprint("negloop: raw reply bytecount",len(rawmsg))
             try:
-                payload = cbor.loads(_decrypt_msg(rawmsg))
+                payload = _decode_raw(rawmsg)
             except:
                 sock.close()
                 _disactivate_session(shandle)
@@ -2015,21 +2780,19 @@ def listen_negotiate(asa_handle, obj):
     # set up the listening queue
     q = None
     _obj_lock.acquire()
-    for x in _obj_registry:
-        if x.objective.name == obj.name:
-            if not x.listening:
-                # set status in objective registry and start listener
-                x.discoverable = True # as from now, discovery is possible
-                x.listening += 1
-                x.listen_q = queue.Queue(_listenQlimit)                
-                q = x.listen_q  
-                # note that there is no separate listener thread as for listen_synchronize
-                break
-            else:
-                # already listening, this is a reentrant listen
-                x.listening += 1
-                q = x.listen_q
-                break
+    x = _obj_registry.get(obj.name)
+    if x:
+        if not x.listening:
+            # set status in objective registry and start listener
+            x.discoverable = True # as from now, discovery is possible
+            x.listening += 1
+            x.listen_q = queue.Queue(_listenQlimit)                
+            q = x.listen_q  
+            # note that there is no separate listener thread as for listen_synchronize
+        else:
+            # already listening, this is a reentrant listen
+            x.listening += 1
+            q = x.listen_q
     _obj_lock.release()
     
     # now we start to listen right here in the calling thread
@@ -2049,9 +2812,9 @@ def listen_negotiate(asa_handle, obj):
     #decrement listening count in objective registry
     #and garbage-collect the queue
     _obj_lock.acquire()
-    for x in _obj_registry:
-        if x.objective.name == obj.name:
-            x.listening -= 1
+    x = _obj_registry.get(obj.name)
+    if x:
+        x.listening -= 1
     _obj_lock.release()
     del q
     
@@ -2097,9 +2860,9 @@ def stop_negotiate(asa_handle, obj):
 
     #clear its listening status in objective registry
     _obj_lock.acquire()
-    for x in _obj_registry:
-        if x.objective.name == obj.name:
-            x.listening = 0
+    x = _obj_registry.get(obj.name)
+    if x:
+        x.listening = 0
     _obj_lock.release() 
     return errors.ok
 
@@ -2182,9 +2945,9 @@ def grecv(asa_handle, shandle, timeout):
                 _disactivate_session(shandle)
                 return errors.noPeer, None
                     
-            ttprint("grecv: raw reply:", rawmsg,"bytecount",len(rawmsg))
+            ttprint("grecv: raw reply bytecount",len(rawmsg))
             try:
-                payload = cbor.loads(_decrypt_msg(rawmsg))
+                payload = _decode_raw(rawmsg)
             except:
                 sock.close()
                 _disactivate_session(shandle)
@@ -2255,14 +3018,13 @@ def synchronize(asa_handle, obj, loc, timeout):
 
     if loc == None:
         _flood_lock.acquire()
-        for x in _flood_cache:
-            if x.objective.name == obj.name and \
-               (x.source.expire == 0 or x.source.expire > int(time.monotonic())):
+        _now = int(time.monotonic())
+        _reap_floods(_now)
+        for x in _flood_index.get(obj.name, {}).values():
+            if x.source.expire == 0 or x.source.expire > _now:
                 _result = x.objective
                 _flood_lock.release()
                 return errors.ok, _result #return first unexpired flooded value
-                #(Note that expired floods are garbage collected when
-                #new flood multicasts are received, not here.)
         _flood_lock.release()
 
     #not flooded
@@ -2276,7 +3038,7 @@ def synchronize(asa_handle, obj, loc, timeout):
 
     if loc == None:
         #Caller did not supply locator, we can try discovery
-        _, ll = discover(asa_handle, obj, timeout)
+        _, ll = discover(asa_handle, obj, timeout, min_results=1)
         if len(ll)==0:
             return errors.notFloodDisc, None
         else:
@@ -2285,72 +3047,425 @@ def synchronize(asa_handle, obj, loc, timeout):
 
     #Did a value arrive with the discovery response (i.e. rapid mode synch)?
     _disc_lock.acquire()
-    for x in _discovery_cache:
-        if x.objective.name == obj.name and x.received:
-            #No need to execute synchronization
-            _result = x.received
-            _disc_lock.release()
-            return errors.ok, _result #return rapid mode reply
+    x = _discovery_cache.get(obj.name)
+    if x and x.received:
+        #No need to execute synchronization
+        _result = x.received
+        _disc_lock.release()
+        return errors.ok, _result #return rapid mode reply
     _disc_lock.release()
 
+    #Is a recent enough value in the synch result cache?
+    _ckey = (obj.name, loc.locator, loc.port)
+    if _synch_caching:
+        _result = _synch_cache_get(_ckey)
+        if _result:
+            return errors.ok, _result
+
     #request synch from the given locator
-    #create TCP socket, assemble message and send it
+    #create TCP socket (or reuse a kept-alive one),
+    #assemble message and send it
     #(lazy code, not checking that TCP is the right one to use)
     sync_sess = _new_session(None)
     shandle = _session_handle(sync_sess, None)
-    sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
     if loc.locator.is_link_local:
         _ifi = loc.ifi
     else:
         _ifi = 0
-    try:
-        ttprint("Sending request_syn to",loc.locator,loc.port,_ifi)
-        sock.settimeout(5) #there should always be a listener
-        sock.connect((str(loc.locator), loc.port,0,_ifi))
-        msg_bytes = _ass_message(M_REQ_SYN, sync_sess, None, obj)
-        sock.sendall(msg_bytes,0)
-    except OSError as ex:
-        tprint("Socket error sending synch request", ex)
-        sock.close()
-        _disactivate_session(shandle)
-        return errors.sockErrSynRq, None
-    #now listen for reply
-    try:
-        sock.settimeout(timeout/1000)
-        rawmsg, send_addr = _recvraw(sock)
-        sock.close()
-        if len(rawmsg) == 0:
-            _disactivate_session(shandle)
-            return errors.noListener, None
-        ttprint("Synch: raw reply:", rawmsg)
+    msg_bytes = _ass_message(M_REQ_SYN, sync_sess, None, obj)
+    _peer = (loc.locator, loc.port, _ifi)
+    sock = _synch_conn_get(_peer)
+    while True:
+        _reused = bool(sock)
         try:
-            payload = cbor.loads(_decrypt_msg(rawmsg))
-        except:
+            if not _reused:
+                ttprint("Sending request_syn to",loc.locator,loc.port,_ifi)
+                sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+                sock.settimeout(5) #there should always be a listener
+                sock.connect((str(loc.locator), loc.port,0,_ifi))
+                if _synch_pooling:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall(msg_bytes,0)
+        except OSError as ex:
+            sock.close()
+            sock = None
+            if _reused:
+                continue #stale kept-alive connection, try a new one
+            tprint("Socket error sending synch request", ex)
             _disactivate_session(shandle)
-            return errors.CBORfail, None
-        msg = _parse_msg(payload)
-        if not msg:
-            #invalid message, cannot process it
+            return errors.sockErrSynRq, None
+        #now listen for reply
+        try:
+            sock.settimeout(timeout/1000)
+            rawmsg, send_addr = _recvraw(sock)
+        except OSError as ex:
+            sock.close()
+            sock = None
+            if _reused:
+                continue
             _disactivate_session(shandle)
-            return errors.noValidSynch, None
-        ttprint("Synch: CBOR->Python:", payload)
-        if msg.mtype == M_SYNCH and msg.id_value == sync_sess:
-            rec_obj = msg.obj
-            rec_obj.loop_count -= 1
-            if rec_obj.name == obj.name:
-                _disactivate_session(shandle)
-                return errors.ok, _detag_obj(rec_obj) #we're done!
-        else:
-            #if it isn't a valid synch message, ignore it
-            ttprint("Invalid synch response")     
-    except OSError as ex:
+            tprint("Socket error receiving synch message", ex)
+            return errors.noSynchReply, None
+        if len(rawmsg) == 0 and _reused:
+            #peer closed the kept-alive connection meanwhile
+            sock.close()
+            sock = None
+            continue
+        break
+    if len(rawmsg) == 0:
         sock.close()
         _disactivate_session(shandle)
-        tprint("Socket error receiving synch message", ex)
-        return errors.noSynchReply, None
+        return errors.noListener, None
+    ttprint("Synch: raw reply bytecount",len(rawmsg))
+    try:
+        payload = _decode_raw(rawmsg)
+    except:
+        sock.close()
+        _disactivate_session(shandle)
+        return errors.CBORfail, None
+    msg = _parse_msg(payload)
+    if not msg:
+        #invalid message, cannot process it
+        sock.close()
+        _disactivate_session(shandle)
+        return errors.noValidSynch, None
+    ttprint("Synch: CBOR->Python:", payload)
+    if msg.mtype == M_SYNCH and msg.id_value == sync_sess:
+        rec_obj = msg.obj
+        rec_obj.loop_count -= 1
+        if rec_obj.name == obj.name:
+            _synch_conn_put(_peer, sock)
+            _disactivate_session(shandle)
+            rec_obj = _detag_obj(rec_obj)
+            if _synch_caching:
+                _synch_cache_put(_ckey, loc, rec_obj)
+            return errors.ok, rec_obj #we're done!
+    else:
+        #if it isn't a valid synch message, ignore it
+        ttprint("Invalid synch response")     
     #all else fails...
+    sock.close()
     _disactivate_session(shandle)
-    return errors.noValidSynch, None               
+    return errors.noValidSynch, None
+
+
+def synch_keepalive(enable=True):
+    """
+############################################################## 
+# synch_keepalive(enable)
+#
+# (NOT part of the official API)
+#
+# Turns persistent synchronization connections on or off.
+# They are off by default.
+#
+# When they are on, synchronize() keeps its TCP connection to
+# each peer open (with TCP_NODELAY) for up to _synchIdle
+# milliseconds after a reply, and reuses it for the next
+# request to the same locator, port and interface. A kept
+# connection that the peer has closed is detected and
+# replaced. Likewise, this node keeps serving synch requests
+# on a connection after replying, instead of closing it.
+#
+# Peers that close after one reply still work normally.
+#
+# No return value
+##############################################################
+"""
+    global _synch_pooling, _synch_reaper
+    _synch_conn_lock.acquire()
+    _synch_pooling = enable
+    if enable and not _synch_reaper:
+        _synch_reaper = call_every(_synchIdle, _synch_conn_reap)
+    elif not enable and _synch_reaper:
+        _synch_reaper.cancel()
+        _synch_reaper = None
+        for _l in _synch_conns.values():
+            for sock, _t in _l:
+                sock.close()
+        _synch_conns.clear()
+    _synch_conn_lock.release()
+
+def synch_cache(enable=True, max_age=None):
+    """
+############################################################## 
+# synch_cache(enable, max_age)
+#
+# (NOT part of the official API)
+#
+# Turns the synchronize() result cache on or off.
+# It is off by default, and turning it off empties it.
+#
+# When it is on, a value obtained by synchronize() from a
+# given locator is reused by later calls for the same
+# objective and locator, instead of asking the network again.
+# A value is reused for max_age milliseconds if given, or
+# otherwise until the locator's discovery TTL expires (values
+# from locators with no expiry are then not cached).
+#
+# Flooded and rapid mode values are unaffected.
+#
+# No return value
+##############################################################
+"""
+    global _synch_caching, _synch_max_age
+    _synch_cache_lock.acquire()
+    _synch_caching = enable
+    _synch_max_age = max_age
+    if not enable:
+        _synch_results.clear()
+    _synch_cache_lock.release()
+
+def synch_cache_stats():
+    """
+############################################################## 
+# synch_cache_stats()
+#
+# (NOT part of the official API)
+#
+# return hits, misses  counts of synchronize() calls answered
+#                      or not answered from the result cache
+#                      since GRASP started
+##############################################################
+"""
+    return _synch_hits, _synch_misses
+
+def flood_batching(enable=True, window=None):
+    """
+############################################################## 
+# flood_batching(enable, window)
+#
+# (NOT part of the official API)
+#
+# Turns flood batching on or off. It is off by default, and
+# turning it off sends any floods still waiting.
+#
+# When it is on, flood() returns at once and the objectives
+# are held for window milliseconds (default _floodBatchWindow),
+# together with those flooded meanwhile by all other ASAs.
+# They are then sent in as few M_FLOOD messages as the
+# multicast size limit allows. Objectives flooded again
+# within the window are sent once, with the latest value.
+# Objectives are only combined if they have the same ttl and
+# loop count. All objectives of a link-local flood() call
+# are sent with loop count 1.
+#
+# No return value
+##############################################################
+"""
+    global _flood_batching, _flood_window
+    _flood_batch_lock.acquire()
+    _flood_batching = enable
+    if window:
+        _flood_window = window
+    _flood_batch_lock.release()
+    if not enable:
+        _send_flood_batch()
+
+def _batch_flood(ttl, floodl, local):
+    """Internal use only"""
+####################################################
+# Add the objectives of one flood() call to the    #
+# batch, and start the window if it was empty.     #
+# Objectives are copied because the ASA may change #
+# them before they are sent. Batches are keyed by  #
+# ttl and each objective's own loop count.         #
+####################################################
+    global _flood_timer
+    _flood_batch_lock.acquire()
+    for obj, _l in floodl:
+        _obj = _oclone(obj)
+        if local:
+            #the whole call is link-local, not just the first objective
+            _obj.loop_count = 1
+        #relays use the first objective's loop count for the whole
+        #message, so each batch holds a single loop count
+        _k = (_obj.name, tuple(_l))
+        for (_t, _lc), _b in _flood_batch.items():
+            if _t == ttl:
+                _b.pop(_k, None) #latest value goes to the end
+        _b = _flood_batch.setdefault((ttl, _obj.loop_count),
+                                     collections.OrderedDict())
+        _b[_k] = [_obj, _l]
+    if not _flood_timer:
+        _flood_timer = call_later(_flood_window, _start_flood_batch)
+    _flood_batch_lock.release()
+
+def _start_flood_batch():
+    """Internal use only"""
+####################################################
+# Timer action: send the batch in a thread of its  #
+# own. Sending may take a while, so not in the     #
+# timer thread, and not in the _workers pool,      #
+# whose queue may be full in a multicast storm.    #
+####################################################
+    threading.Thread(target=_send_flood_batch, daemon=True).start()
+
+def _send_flood_batch():
+    """Internal use only"""
+####################################################
+# Send all batched floods, split into M_FLOOD      #
+# messages that fit in _multicast_size. An         #
+# objective too big to share a message is sent     #
+# on its own, as flood() would.                    #
+####################################################
+    global _flood_batch, _flood_timer
+    _flood_batch_lock.acquire()
+    _batch = _flood_batch
+    _flood_batch = {}
+    if _flood_timer:
+        _flood_timer.cancel()
+        _flood_timer = None
+    _flood_batch_lock.release()
+
+    for (ttl, _lc), _b in _batch.items():
+        _slot = os.urandom(16) #placeholder for LL address
+        _items = []
+        for obj, _l in _b.values():
+            if _l != []:
+                if _l[1] == _unspec_address.packed:
+                    _l[1] = _slot
+            _items.append(cbor.dumps([_ass_obj(obj), _l]))
+        _init_bytes = cbor.dumps(_session_locator.packed)
+        _ttl_bytes = cbor.dumps(ttl)
+        #room for the header, with a 5-byte session ID and array
+        #head, and for the encryption padding
+        _room = _multicast_size - 1 - 5 - len(_init_bytes) - \
+                len(_ttl_bytes) - 5 - (16 if _crypto else 0)
+        i = 0
+        while i < len(_items):
+            _size = len(_items[i])
+            j = i + 1
+            while j < len(_items) and _size + len(_items[j]) <= _room:
+                _size += len(_items[j])
+                j += 1
+            flood_session = _new_session(_session_locator)
+            msg_bytes = _cbor_array_head(4 + j - i) + cbor.dumps(M_FLOOD) + \
+                        cbor.dumps(flood_session) + _init_bytes + \
+                        _ttl_bytes + b''.join(_items[i:j])
+            ttprint("Sending batch of", j - i, "flooded objectives")
+            if _slot in msg_bytes:
+                _mc_send(msg_bytes.split(_slot), "flood batch")
+            else:
+                _mc_send(_encrypt_msg(msg_bytes), "flood batch")
+            _disactivate_session(_session_handle(flood_session, None))
+            i = j
+
+def _synch_cache_get(key):
+    """Internal use only"""
+##################################
+# look up an unexpired synch result
+# and count the hit or miss
+##################################
+    global _synch_hits, _synch_misses
+    _synch_cache_lock.acquire()
+    x = _synch_results.get(key)
+    if x and x[1] > time.monotonic():
+        _synch_hits += 1
+        _synch_results.move_to_end(key)
+        _synch_cache_lock.release()
+        return _oclone(x[0])
+    if x:
+        del _synch_results[key]
+    _synch_misses += 1
+    _synch_cache_lock.release()
+    return None
+
+def _synch_cache_put(key, loc, obj):
+    """Internal use only"""
+##################################
+# store a synch result until its
+# max age or locator TTL runs out
+##################################
+    _synch_cache_lock.acquire()
+    if _synch_max_age:
+        _expire = time.monotonic() + _synch_max_age/1000
+    else:
+        _expire = loc.expire #0 if it never expires
+    if _synch_caching and _expire:
+        _synch_results[key] = (_oclone(obj), _expire)
+        _synch_results.move_to_end(key)
+        if len(_synch_results) > _synchCacheLimit:
+            _synch_results.popitem(last=False) #delete Least Recently Used
+    _synch_cache_lock.release()
+
+def _synch_conn_get(peer):
+    """Internal use only"""
+##################################
+# get a healthy kept-alive synch
+# connection to peer, or None
+##################################
+    if not _synch_pooling:
+        return None
+    _now = time.monotonic()
+    _synch_conn_lock.acquire()
+    _l = _synch_conns.get(peer, [])
+    while _l:
+        sock, _t = _l.pop()
+        if _now - _t < _synchIdle/1000 and _sock_idle(sock):
+            _synch_conn_lock.release()
+            return sock
+        sock.close()
+    _synch_conn_lock.release()
+    return None
+
+def _synch_conn_put(peer, sock):
+    """Internal use only"""
+##################################
+# keep a synch connection for
+# reuse, or close it
+##################################
+    _synch_conn_lock.acquire()
+    if _synch_pooling:
+        _l = _synch_conns.setdefault(peer, [])
+        if len(_l) < _synchPoolMax:
+            _l.append((sock, time.monotonic()))
+            sock = None
+    _synch_conn_lock.release()
+    if sock:
+        sock.close()
+
+def _synch_conn_reap():
+    """Internal use only"""
+##################################
+# timer action for synch_keepalive()
+# closes idle synch connections
+##################################
+    _now = time.monotonic()
+    _synch_conn_lock.acquire()
+    for peer in list(_synch_conns):
+        _keep = []
+        for sock, _t in _synch_conns[peer]:
+            if _now - _t < _synchIdle/1000:
+                _keep.append((sock, _t))
+            else:
+                sock.close()
+        if _keep:
+            _synch_conns[peer] = _keep
+        else:
+            del _synch_conns[peer]
+    _synch_conn_lock.release()
+
+def _sock_idle(sock):
+    """Internal use only"""
+##################################
+# health check: True if a connected
+# TCP socket is open with nothing
+# waiting to be read
+##################################
+    try:
+        sock.setblocking(False)
+        sock.recv(1, socket.MSG_PEEK)
+        return False #closed by peer, or stray data
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    finally:
+        try:
+            sock.setblocking(True)
+        except OSError:
+            pass               
 
 
 
@@ -2363,7 +3478,8 @@ def listen_synchronize(asa_handle, obj):
 # requests for the given objective, and to
 # respond with the objective value given in the call.
 #
-# This call should be repeated whenever the value changes.
+# This call should be repeated whenever the value changes,
+# or update_value() can be used instead.
 #
 # return zero if successful
 # return errorcode if failure
@@ -2386,98 +3502,92 @@ def listen_synchronize(asa_handle, obj):
     
     #ttprint("listen_synchronize: Obj value recvd:",obj.name,obj.value)
     _obj_lock.acquire()
-    for x in _obj_registry:
-        if x.objective.name == obj.name:
-            # Set value in objective registry.
-            # Note that this objective has not been transmitted
-            # so the value does not need detagging.
-            x.objective.value = obj.value
-            #ttprint("listen_synchronize: Obj value set",i,obj.name,obj.value,_obj_registry[i].objective.value)
-            if not x.listening:
-                # set status in objective registry and start listener
-                x.discoverable = True # as from now, discovery is possible
-                x.listening = 1
-                x.listen_q =  queue.Queue(_listenQlimit)
-                _synch_listen(obj).start()
-                break
+    x = _obj_registry.get(obj.name)
+    if x:
+        # Set value in objective registry.
+        # Note that this objective has not been transmitted
+        # so the value does not need detagging.
+        x.objective.value = obj.value
+        x.version += 1
+        #ttprint("listen_synchronize: Obj value set",obj.name,obj.value,x.objective.value)
+        if not x.listening:
+            # set status in objective registry; from now on
+            # requests are answered by _tcp_request()
+            x.discoverable = True # as from now, discovery is possible
+            x.listening = 1
+            x.listen_q =  queue.Queue(_listenQlimit)
+            x.synch_listen = True
     _obj_lock.release() 
     
     return errors.ok
 
 
 
-class _synch_listen(threading.Thread):
+def update_value(asa_handle, obj):
+    """
+##############################################################
+# update_value(asa_handle, objective)
+#
+# (NOT part of the official API)
+#
+# Sets a new value for a registered synchronization objective,
+# without changing its listening state. Once listen_synchronize()
+# has been called, GRASP encodes the value once per update and
+# reuses the encoding for every synchronization request, so
+# the value must not be modified in place afterwards: call
+# update_value() (or listen_synchronize()) with the new value.
+#
+# return zero if successful
+# return errorcode if failure
+##############################################################
+"""
+    errorcode = _check_asa_obj(asa_handle, obj, True)
+    if errorcode:
+        return errorcode
+    if not obj.synch:
+        return errors.notSynch
+    _obj_lock.acquire()
+    x = _obj_registry.get(obj.name)
+    if x:
+        x.objective.value = obj.value
+        x.version += 1
+    _obj_lock.release()
+    return errors.ok
+
+def _synch_reply(x, asock, msg):
     """Internal use only"""
 ####################################################
-# Listener thread for synch requests               #
+# Answer a synch request for registered objective  #
+# x on connected socket asock, then close it,      #
+# unless synch_keepalive() is on.                  #
+#                                                  #
+# Called in the worker pool by _tcp_request() for  #
+# objectives passed to listen_synchronize().       #
 #                                                  #
-# This thread is invoked by listen_synchronize     #
-# and must not be activated otherwise.             #
+# return True if asock is kept open for more       #
 ####################################################
-    def __init__(self, obj):
-        threading.Thread.__init__(self, daemon=True)
-        self.obj = obj
-        
-    def run(self):
-        #ttprint("synch_listen Obj in:", self.obj.name,self.obj.value)
-        keep_going = True
-        while keep_going:
-            not_found = True
-            _obj_lock.acquire()
-            for x in _obj_registry:
-                if x.objective.name == self.obj.name:
-                    # we found our objective
-                    #ttprint("synch_listen registry value:", x.objective.value)
-                    not_found = False
-                    if not x.listening:
-                        # can stop listening and exit thread
-                        _obj_lock.release()
-                        keep_going = False                        
-                    else:
-                        # we're still listening
-                        q = x.listen_q
-                        _obj_lock.release()
-                        # get next request from queue
-                        # what we find in the queue is [asock,send_addr,message]
-                        # message is a Request Synch message
-                        # asock is a connected TCP socket
-                        rq = q.get()
-
-                        ttprint("Got synch request from queue")
-                        # get the latest value from the registry
-                        # (could have changed while we waited for the request)
-
-                        #Note - we use this apparently pointless extra variable
-                        # 'ovalue' because when testing inside a single node, there
-                        # might be cases where the 'obj' parameter is the exact same
-                        # object as the entry in '_obj_registry'
-                        ovalue = None
-                        _obj_lock.acquire()
-                        for y in _obj_registry:
-                            if y.objective.name == self.obj.name:
-                                #ttprint("Objectives", y.objective, self.obj)
-                                ovalue = y.objective.value
-                                #ttprint("synch_listen Obj value:", ovalue)
-                        # Note - this is the value stored in the registry so
-                        # does not need detagging
-                        self.obj.value = ovalue
-                        _obj_lock.release()                        
-                        # send back reply
-                        msg_bytes = _ass_message(M_SYNCH, rq[2].id_value, None, self.obj)
-                        try:
-                            rq[0].sendall(msg_bytes,0)
-                            ttprint("Sent Synch")
-                        except OSError as ex:
-                            ttprint("Synch socket failure",ex)
-                        rq[0].close()
-                        break
-               
-            # should never need to do this, but race conditions
-            # could perhaps arise
-            if not_found:
-                _obj_lock.release()
-                keep_going = False
-        ttprint("Exit synch_listen thread")
+    ttprint("Got synch request")
+    # use the latest value from the registry, encoded
+    # once per version. Note - this value does not need detagging
+    _enc = x.encoded
+    if not _enc or _enc[0] != x.version:
+        _v = x.version #read before the value, in case it changes
+        _enc = (_v, cbor.dumps(_ass_obj(x.objective)))
+        x.encoded = _enc
+    # [M_SYNCH, session-id, objective] is a 3-element array
+    msg_bytes = _encrypt_msg(b'\x83' + cbor.dumps(M_SYNCH) +
+                             cbor.dumps(msg.id_value) + _enc[1])
+    try:
+        if _synch_pooling:
+            asock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        asock.sendall(msg_bytes,0)
+        ttprint("Sent Synch")
+        if _synch_pooling:
+            return True
+    except OSError as ex:
+        ttprint("Synch socket failure",ex)
+    asock.close()
+    return False
 
 
 def stop_synchronize(asa_handle, obj):
@@ -2501,9 +3611,10 @@ def stop_synchronize(asa_handle, obj):
 
     #clear its listening status in objective registry
     _obj_lock.acquire()
-    for x in _obj_registry:
-        if x.objective.name == obj.name:
-            x.listening = 0
+    x = _obj_registry.get(obj.name)
+    if x:
+        x.listening = 0
+        x.synch_listen = False
     _obj_lock.release() 
     return errors.ok
 
@@ -2591,28 +3702,35 @@ def flood(asa_handle, ttl, *tagged_obj):
         _floodl.append([x.objective, _l])
         #ttprint("Flood list:",_floodl)
         
-    flood_session = _new_session(_session_locator)
- 
     #ttprint("Flood TTL:",ttl)
 
     if not ttl:
         ttl = 0 # Make it an integer rather than None or False
+
+    if _flood_batching:
+        _batch_flood(ttl, _floodl, _local_flood)
+        return errors.ok
+
+    flood_session = _new_session(_session_locator)
     
-    # Can't use a comprehension because we need the actual
-    # list index in order select the correct socket.
-    for i in range(len(_ll_zone_ids)):
-        for _o in _floodl:
-            _l = _o[1]
-            if _l != []:
-                if _l[1] == _unspec_address.packed:
-                    _l[1] = _ll_zone_ids[i][1].packed # replace with LL address
-        msg_bytes = _ass_message(M_FLOOD, flood_session, _session_locator.packed, ttl, _floodl)
-        try:
-            _mcssocks[i][1].sendto(msg_bytes,0,(str(ALL_GRASP_NEIGHBORS_6), GRASP_LISTEN_PORT))
-        except:
-            #might fail if CPU suspended etc
-            ttprint("MC socket failure in flood()")
-            _fixmcsock(i)
+    # Encode the message once. An unspecified address in a
+    # locator is replaced by a random placeholder, so that
+    # each interface's LL address can be spliced into the
+    # CBOR bytes before encryption.
+    _slot = None
+    for _o in _floodl:
+        _l = _o[1]
+        if _l != []:
+            if _l[1] == _unspec_address.packed:
+                if not _slot:
+                    _slot = os.urandom(16)
+                _l[1] = _slot # replaced with LL address below
+    msg_bytes = _ass_message(M_FLOOD, flood_session, _session_locator.packed,
+                             ttl, _floodl, encrypt=False)
+    if _slot:
+        _mc_send(msg_bytes.split(_slot), "flood()")
+    else:
+        _mc_send(_encrypt_msg(msg_bytes), "flood()")
     _disactivate_session(_session_handle(flood_session, None))
     return errors.ok
 
@@ -2643,15 +3761,14 @@ def get_flood(asa_handle, obj):
         return errors.notSynch, None
 
     #Collect list of unexpired flooded tagged_objective
-    #(Note that expired floods are garbage collected when
-    #new flood multicasts are received, not here.)
 
     _l = []  #Initialise empty list
     
     _flood_lock.acquire()
-    for x in _flood_cache:
-        if x.objective.name == obj.name and \
-           (x.source.expire == 0 or (x.source.expire > int(time.monotonic()))):
+    _now = int(time.monotonic())
+    _reap_floods(_now)
+    for x in _flood_index.get(obj.name, {}).values():
+        if x.source.expire == 0 or (x.source.expire > _now):
             _l.append(x)
     _flood_lock.release()
 
@@ -2679,16 +3796,58 @@ def expire_flood(asa_handle, tagged_obj):
     if _no_handle(asa_handle):
         return errors.noASA
     
-    #(Note that expired floods are garbage collected when
-    #new flood multicasts are received, not here.)
+    #(Note that expired floods are garbage collected later,
+    #not here.)
     _flood_lock.acquire()
-    for x in _flood_cache:
-        if (x == tagged_obj) and (x.source.expire > 0):
-            x.source.expire = int(time.monotonic())-1
+    x = _flood_cache.get(_flood_key(tagged_obj))
+    if (x == tagged_obj) and (x.source.expire > 0):
+        x.source.expire = int(time.monotonic())-1
+        _push_flood_expiry(x)
     _flood_lock.release()
 
     return errors.ok
 
+def call_later(delay, func, *args):
+    """
+##############################################################
+# call_later(delay, func, *args)
+#
+# (NOT part of the official API)
+#
+# Calls func(*args) once, after delay milliseconds.
+#
+# func is called in the GRASP timer thread, which is shared by
+# all ASAs and by GRASP itself, so it must return promptly.
+# Start a thread from func if it needs to block. This includes
+# calling flood(), which may wait while a multicast socket
+# is repaired.
+#
+# Resolution is about 100 milliseconds.
+#
+# return a timer_handle; its cancel() method stops the call
+##############################################################
+"""
+    return _get_timer_wheel().schedule(delay, 0, func, args)
+
+def call_every(interval, func, *args):
+    """
+##############################################################
+# call_every(interval, func, *args)
+#
+# (NOT part of the official API)
+#
+# Calls func(*args) every interval milliseconds, starting
+# after the first interval, until cancelled.
+#
+# The same rules apply as for call_later(). Use this instead
+# of a dedicated thread that sleeps and loops, for example
+# to repeat a flood() call.
+#
+# return a timer_handle; its cancel() method stops the calls
+##############################################################
+"""
+    return _get_timer_wheel().schedule(interval, interval, func, args)
+
 ########## END OF OFFICIAL API FUNCTIONS ###########
 
 ####################################
@@ -2949,25 +4108,6 @@ def init_bubble_text(cap):
 # ASA registry  functions          #
 ####################################
 
-def _retrieve_asa(asa_name):
-    """Internal use only"""
-####################################
-# Retrieve an ASA entry by name    #
-#                                  #
-# return index in registry         #
-# RETURNS WITH _asa_lock ACQUIRED!  #
-# return -1 if nonesuch            #
-####################################
-    _asa_lock.acquire()
-    asa_ct = len(_asa_registry)
-    for i in range(asa_ct):
-        if asa_name == _asa_registry[i].name:
-            return i
-    _asa_lock.release()
-    return -1
-
-
-
 def _no_handle(asa_handle):
     """Internal use only"""
 ####################################
@@ -2975,8 +4115,8 @@ def _no_handle(asa_handle):
 #                                  #
 # return True if handle is absent   #
 ####################################
-    # don't think we need the lock for this
-    return not([x for x in _asa_registry if x.handle == asa_handle])
+    # no lock needed, _asa_handles is copy-on-write
+    return not asa_handle in _asa_handles
 
 
 
@@ -2997,11 +4137,11 @@ def _check_asa_obj(asa_handle, obj, sending_synch):
         return errors.notSynch
     if _no_handle(asa_handle):
         return errors.noASA
-    _obj_lock.acquire()
-    if (obj.neg or sending_synch) and not([x for x in _obj_registry if x.objective.name == obj.name and asa_handle in x.asa_id]):
-        _obj_lock.release()
-        return errors.notYourObj
-    _obj_lock.release()
+    if obj.neg or sending_synch:
+        # no lock needed, _obj_registry is copy-on-write
+        x = _obj_registry.get(obj.name)
+        if not (x and asa_handle in x.asa_id):
+            return errors.notYourObj
 
     return errors.ok
 
@@ -3010,6 +4150,44 @@ def _check_asa_obj(asa_handle, obj, sending_synch):
 ####################################
 
 _prng = random.SystemRandom() # best PRNG we can get
+
+def _store_session(session_inst):
+    """Internal use only"""
+####################################
+# Store a Session ID entry,        #
+# replacing any entry with the     #
+# same ID and source.              #
+#                                  #
+# Caller must hold _sess_lock      #
+####################################
+    key = (session_inst.id_value, session_inst.id_source)
+    if not key in _session_id_cache:
+        _session_values[session_inst.id_value] += 1
+    _session_id_cache[key] = session_inst
+    if session_inst.id_active:
+        _session_inactive.pop(key, None)
+    else:
+        _session_inactive[key] = True
+        _session_inactive.move_to_end(key) #newest inactive entry
+
+def _evict_session():
+    """Internal use only"""
+####################################
+# Delete the oldest inactive       #
+# Session ID entry                 #
+#                                  #
+# return False if none to delete   #
+# Caller must hold _sess_lock      #
+####################################
+    if not _session_inactive:
+        return False
+    key, _ = _session_inactive.popitem(last=False)
+    del _session_id_cache[key]
+    _session_values[key[0]] -= 1
+    if not _session_values[key[0]]:
+        del _session_values[key[0]]
+    return True
+
 def _new_session(locator):
     """Internal use only"""
 ####################################
@@ -3022,14 +4200,17 @@ def _new_session(locator):
         #x = _prng.randint(0, 0xffffff) #old 24 bit version
         x = _prng.randint(0, 0xffffffff)
         # does _session_id_cache contain an id_value = x?
-        if not([clash for clash in _session_id_cache if clash.id_value == x]):
+        if not x in _session_values:
+            if len(_session_id_cache) >= _sessionCacheLimit:
+                _evict_session()
             if locator == None:
-                _session_id_cache.append(_session_instance(x,True,None))
+                _store_session(_session_instance(x,True,None))
             else:
-                _session_id_cache.append(_session_instance(x,True,locator.packed))
+                _store_session(_session_instance(x,True,locator.packed))
             _sess_lock.release()
             return x
     # If we're here, something is deeply suspect and we have to give up.
+    _sess_lock.release()
     raise RuntimeError("Ten successive pseudo-random session ID clashes")
 
 
@@ -3049,40 +4230,29 @@ def _insert_session(session_inst, _check_race = False):
     #check for a clash
     _sess_lock.acquire()
     
-    if ([clash for clash in _session_id_cache if clash.id_value == new_id]):
+    if new_id in _session_values:
         # duplicate, need to check source address
-        _sess_lock.release()
         if _check_race:
+            _sess_lock.release()
             return False # incredibly unlikely race condition, do nothing
-        clash = _get_session(_session_handle(new_id,session_inst.id_source))
-        #the following test is because in theory the session could have
-        #just been deleted by another thread...
-        if clash:
-            if clash.id_source == session_inst.id_source:
-                #now we have a confirmed clash, cannot continue
-                return False
-        #duplicate has a different source address (or it vanished)
+        clash = _session_id_cache.get((new_id, session_inst.id_source))
+        if clash and clash.id_active:
+            #now we have a confirmed clash, cannot continue
+            _sess_lock.release()
+            return False
+        #duplicate has a different source address (or is inactive)
         #so we can continue
-        _sess_lock.acquire()
-    session_ct = len(_session_id_cache)
-    if session_ct >= _sessionCacheLimit:
+    if len(_session_id_cache) >= _sessionCacheLimit and \
+       not (new_id, session_inst.id_source) in _session_id_cache:
         # try to free a space
-        for i in range(session_ct):
-            if not _session_id_cache[i].id_active:
-                # found first inactive entry - delete it and append new one
-                del _session_id_cache[i]
-                _session_id_cache.append(session_inst)
-                _sess_lock.release()
-                return True
-        # no free space, fail
-        tprint("Session cache overflow!")
-        _sess_lock.release()
-        return False
-    else:
-        #append new one
-        _session_id_cache.append(session_inst)
-        _sess_lock.release()
-        return True
+        if not _evict_session():
+            # no free space, fail
+            tprint("Session cache overflow!")
+            _sess_lock.release()
+            return False
+    _store_session(session_inst)
+    _sess_lock.release()
+    return True
 
 
 
@@ -3097,11 +4267,10 @@ def _get_session(shandle):
 # else return _session_instance    #
 ####################################   
     _sess_lock.acquire()
-    for s in _session_id_cache:
-        if shandle.id_value == s.id_value and shandle.id_source == s.id_source and s.id_active:
-            _sess_lock.release()
-            return s
+    s = _session_id_cache.get((shandle.id_value, shandle.id_source))
     _sess_lock.release()
+    if s and s.id_active:
+        return s
     return False
 
 
@@ -3113,15 +4282,11 @@ def _update_session(session_inst):
 #                                  #
 # return True if successful        #
 ####################################
-    old_id = session_inst.id_value
-    old_src = session_inst.id_source
     _sess_lock.acquire()
-    session_ct = len(_session_id_cache)
-    for i in range(session_ct):
-        if old_id == _session_id_cache[i].id_value and old_src == _session_id_cache[i].id_source:
-            _session_id_cache[i] = session_inst
-            _sess_lock.release()
-            return True
+    if (session_inst.id_value, session_inst.id_source) in _session_id_cache:
+        _store_session(session_inst)
+        _sess_lock.release()
+        return True
     #no such ID/source, fail
     _sess_lock.release()
     return False
@@ -3144,6 +4309,79 @@ def _disactivate_session(shandle):
         _update_session(s)
     return
 
+####################################
+# Flood cache functions            #
+#                                  #
+# Caller must hold _flood_lock     #
+####################################
+
+_flood_seq = itertools.count() # tie-breaker for heap entries
+
+def _flood_key(tagged_obj):
+    """Internal use only"""
+    return (tagged_obj.objective.name, tagged_obj.source.locator,
+            tagged_obj.source.port)
+
+def _push_flood_expiry(tagged_obj):
+    """Internal use only"""
+####################################
+# Schedule a flood cache entry for #
+# expiry. Superseded heap entries  #
+# are discarded when popped.       #
+####################################
+    heapq.heappush(_flood_expiry, [tagged_obj.source.expire, next(_flood_seq),
+                                   _flood_key(tagged_obj), tagged_obj])
+    if len(_flood_expiry) > 2*len(_flood_cache) + 100:
+        #too many superseded entries, rebuild the heap
+        _flood_expiry[:] = [[x.source.expire, next(_flood_seq), k, x]
+                            for k, x in _flood_cache.items() if x.source.expire]
+        heapq.heapify(_flood_expiry)
+
+def _unstore_flood(key):
+    """Internal use only"""
+    x = _flood_cache.pop(key)
+    _entries = _flood_index[key[0]]
+    del _entries[key]
+    if not _entries:
+        del _flood_index[key[0]]
+    return x
+
+def _store_flood(tagged_obj):
+    """Internal use only"""
+####################################
+# Store a flooded objective,       #
+# replacing any previous version   #
+# from the same source             #
+####################################
+    key = _flood_key(tagged_obj)
+    if key in _flood_cache:
+        #zap old version
+        _unstore_flood(key)
+    #if cache is full, delete oldest
+    while _flood_cache and len(_flood_cache) >= _floodCacheLimit:
+        _unstore_flood(next(iter(_flood_cache)))
+    #insert new one in MRU position
+    _flood_cache[key] = tagged_obj
+    _flood_index.setdefault(key[0], collections.OrderedDict())[key] = tagged_obj
+    if tagged_obj.source.expire:
+        _push_flood_expiry(tagged_obj)
+
+def _reap_floods(now):
+    """Internal use only"""
+####################################
+# Delete flood cache entries that  #
+# expired before now               #
+####################################
+    while _flood_expiry and _flood_expiry[0][0] < now:
+        _, _, key, x = heapq.heappop(_flood_expiry)
+        if _flood_cache.get(key) is x:
+            if x.source.expire and x.source.expire < now:
+                #ttprint("Expiring flood", key[0], x.source.expire)
+                _unstore_flood(key)
+            elif x.source.expire:
+                #expiry was changed, reschedule
+                _push_flood_expiry(x)
+
 def _ass_obj(x):
     """Internal use only"""
 ######################################
@@ -3190,12 +4428,13 @@ def _ass_opt(x):
         return [M_INVALID]
 
 
-def _ass_message(msg_type, session_id, initiator, *whatever):
+def _ass_message(msg_type, session_id, initiator, *whatever, encrypt=True):
     """Internal use only"""
 ####################################
 # Assemble a CBOR message          #
 #                                  #
 # returns CBOR bytes               #
+# (not encrypted if encrypt=False) #
 ####################################
 
     # Initialise message with type and session idenntifier
@@ -3235,6 +4474,8 @@ def _ass_message(msg_type, session_id, initiator, *whatever):
     #Convert to CBOR bytes
     msg_bytes = cbor.dumps(msg)
     ttprint("Assembled CBOR message:",msg_bytes)
+    if not encrypt:
+        return msg_bytes
     return _encrypt_msg(msg_bytes)
 
 
@@ -3616,98 +4857,511 @@ def _fixmcsock(i):
             tprint("Waiting for interface") 
             time.sleep(5) # wait for interface to come back up
 
-    # The TCP listening socket and thread is now broken and must be recreated.
-    # Note: as coded 20160605, the broken thread is not garbage-collected.
+    # The TCP listening socket is now broken and must be recreated.
 
     _init_drsocks(i)
 
-class _mclisten(threading.Thread):
+def _mc_send(msg, caller, skip_ifi=None):
     """Internal use only"""
 ####################################################
-# Listen for GRASP link-local multicasts           #
-# (Discovery messages and synchronisation Flood    #
-# messages) and queue them for handling            #
-#                                                  #
-# This runs as a thread                            #
+# Send a multicast on all interfaces except        #
+# skip_ifi. msg is either the bytes to send, or a  #
+# list of CBOR fragments to be joined by each      #
+# interface's LL address and then encrypted.       #
 ####################################################
-    def __init__(self):
+
+    # Can't use a comprehension because we need the actual
+    # list index in order select the correct socket.
+    for i in range(len(_ll_zone_ids)):
+        if _ll_zone_ids[i][0] == skip_ifi:
+            continue
+        if type(msg) == list:
+            msg_bytes = _encrypt_msg(_ll_zone_ids[i][1].packed.join(msg))
+        else:
+            msg_bytes = msg
+        try:
+            _mcssocks[i][1].sendto(msg_bytes,0,_mcDest)
+        except:
+            #might fail if CPU suspended etc
+            tprint("MC socket failure in", caller)
+            _fixmcsock(i)
+
+class _worker(threading.Thread):
+    """Internal use only"""
+    def __init__(self, q):
         threading.Thread.__init__(self, daemon=True)
-        
+        self.q = q
     def run(self):
-        global _mc_restart
-        mcrsock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
-        mcrsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        mcrsock.bind(('',GRASP_LISTEN_PORT))
-        #join LL multicast group on all interfaces
-        for x in _ll_zone_ids:
-            mreq = ALL_GRASP_NEIGHBORS_6.packed + struct.pack('@I', x[0])
-            while True:
-                try:
-                    mcrsock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, mreq)
-                    break
-                except:
-                    #failed, probably too soon during restart so wait & retry
-                    time.sleep(2)
-                    
-        mcrsock.settimeout(120)
-
-        tprint("LL multicast listener is up")
         while True:
+            func, args = self.q.get()
             try:
-                ttprint("Listening for LL multicasts")
-                rawmsg, send_addr = mcrsock.recvfrom(_multicast_size)
-                if "%" in send_addr[0]:
-                    a,b = send_addr[0].split('%')
-                    saddr = ipaddress.IPv6Address(a)
-                else:
-                    saddr = ipaddress.IPv6Address(send_addr[0])
-                sport = send_addr[1]
-                ifn = send_addr[3]
-                ttprint("Received multicast",rawmsg,"from",saddr,"port",
-                        sport,"interface",ifn,"bytecount",len(rawmsg))
-                if _listen_self or (not [ifn, saddr] in _ll_zone_ids):
-
-                    #Because we listen to ourselves in testing
-                    #and because we can't trust IPV6_MULTICAST_LOOP = 0
-                       
+                func(*args)
+            except Exception as ex:
+                tprint("Exception in worker:", ex)
+                traceback.print_exc()
+
+class _worker_pool:
+    """Internal use only"""
+####################################################
+# Bounded pool of worker threads. Jobs are queued  #
+# and run in arrival order by whichever worker is  #
+# free, so no socket needs a thread of its own.    #
+#                                                  #
+# A _fair_queue may be given instead, to be filled #
+# by its own put() rather than by submit().        #
+####################################################
+    def __init__(self, workers, qlimit, q=None):
+        self.q = q or queue.Queue(qlimit)
+        for _ in range(workers):
+            _worker(self.q).start()
+
+    def submit(self, func, *args):
+        """Queue func(*args), return False if the pool is overloaded"""
+        try:
+            self.q.put((func, args), block=False)
+            return True
+        except queue.Full:
+            return False
+
+class _keyed_pool:
+    """Internal use only"""
+####################################################
+# Worker threads with a bounded queue each. Jobs   #
+# with the same key always go to the same worker,  #
+# so they run in arrival order, while jobs with    #
+# other keys run in parallel.                      #
+####################################################
+    def __init__(self, workers, qlimit):
+        self.qs = [queue.Queue(qlimit) for _ in range(workers)]
+        for q in self.qs:
+            _worker(q).start()
+
+    def submit(self, key, func, *args):
+        """Queue func(*args) behind earlier jobs for key,
+        return False if that worker is overloaded"""
+        try:
+            self.qs[hash(key) % len(self.qs)].put((func, args), block=False)
+            return True
+        except queue.Full:
+            return False
+
+class _fair_queue:
+    """Internal use only"""
+####################################################
+# Bounded multicast queue with deficit round robin #
+# (DRR) between flows, one flow per source address #
+# and interface, so a chatty neighbour can't       #
+# starve the others. Each flow may take quantum    #
+# bytes per round.                                 #
+#                                                  #
+# Urgent entries (for _mcPriority objectives) are  #
+# served before any flow.                          #
+#                                                  #
+# When full, the newest entry of the longest flow  #
+# is dropped, so the chatty neighbour loses its    #
+# own packets. Drops are counted by _count_drop(). #
+####################################################
+    def __init__(self, qlimit, quantum):
+        self.cond = threading.Condition()
+        self.limit = qlimit
+        self.quantum = quantum
+        self.count = 0
+        self.urgent = collections.deque() #(flow, mtype, item)
+        self.flows = {}   #flow -> deque of (cost, mtype, item)
+        self.deficit = {} #flow -> bytes it may still take this round
+        self.active = collections.deque() #flows with entries, in DRR order
+        self.visited = False #head flow has had its quantum this round
+
+    def put(self, flow, mtype, item, cost, urgent=False):
+        """Queue item from flow, dropping something if full"""
+        self.cond.acquire()
+        if self.count >= self.limit:
+            _long = max(self.flows, key=lambda f: len(self.flows[f]), default=None)
+            if _long == None or (not urgent and
+                    len(self.flows.get(flow, ())) >= len(self.flows[_long])):
+                #this flow is the worst offender (or all is urgent)
+                self.cond.release()
+                _count_drop(flow, mtype)
+                return
+            _, _mtype, _ = self.flows[_long].pop()
+            self._forget(_long)
+            self.count -= 1
+            _count_drop(_long, _mtype)
+        if urgent:
+            self.urgent.append((flow, mtype, item))
+        else:
+            if flow not in self.flows:
+                self.flows[flow] = collections.deque()
+                self.deficit[flow] = 0
+                self.active.append(flow)
+            self.flows[flow].append((min(cost, self.quantum), mtype, item))
+        self.count += 1
+        self.cond.notify()
+        self.cond.release()
+
+    def _forget(self, flow):
+        #drop flow from the round if it has emptied
+        if not self.flows[flow]:
+            if self.active[0] == flow:
+                self.visited = False
+            self.active.remove(flow)
+            del self.flows[flow]
+            del self.deficit[flow]
+
+    def get(self):
+        """Wait for and return the next item"""
+        self.cond.acquire()
+        while not self.count:
+            self.cond.wait()
+        self.count -= 1
+        if self.urgent:
+            _, _, item = self.urgent.popleft()
+            self.cond.release()
+            return item
+        while True:
+            flow = self.active[0]
+            if not self.visited:
+                self.deficit[flow] += self.quantum
+                self.visited = True
+            q = self.flows[flow]
+            if self.deficit[flow] >= q[0][0]:
+                cost, _, item = q.popleft()
+                self.deficit[flow] -= cost
+                self._forget(flow)
+                self.cond.release()
+                return item
+            #used up its share, next flow's turn
+            self.active.rotate(-1)
+            self.visited = False
+
+def _count_drop(flow, mtype):
+    """Internal use only"""
+####################################
+# Count a dropped multicast by     #
+# source and by message type       #
+####################################
+    ttprint("Multicast queue full: packet dropped from", flow[0])
+    _drop_lock.acquire()
+    _drops_by_source[flow] += 1
+    _drops_by_type[mtype] += 1
+    _drop_lock.release()
+
+def mc_drops():
+    """
+############################################################## 
+# mc_drops()
+#
+# (NOT part of the official API)
+#
+# return by_source, by_type    counts of incoming multicasts
+#                              dropped because the discovery or
+#                              flood queue was full, as dicts
+#                              keyed by (source address, interface)
+#                              and by message type (M_DISCOVERY
+#                              or M_FLOOD)
+##############################################################
+"""
+    _drop_lock.acquire()
+    _result = dict(_drops_by_source), dict(_drops_by_type)
+    _drop_lock.release()
+    return _result
+
+def relay_drops():
+    """
+############################################################## 
+# relay_drops()
+#
+# (NOT part of the official API)
+#
+# return by_originator    counts of floods not relayed because
+#                         the relay queue was full, as a dict
+#                         keyed by originator address; empty
+#                         if this node does not relay
+##############################################################
+"""
+    if not _relayer:
+        return {}
+    _relayer.cond.acquire()
+    _result = dict(_relayer.dropped)
+    _relayer.cond.release()
+    return _result
+
+class _reactor_thread(threading.Thread):
+    """Internal use only"""
+####################################################
+# The reactor: a single thread that waits on all   #
+# GRASP listening sockets with a selector          #
+#  - the LL multicast socket                       #
+#  - a discovery response listener per interface   #
+#  - a request listener per objective              #
+#  - connections accepted by those listeners,      #
+#    until their first bytes arrive                #
+# and calls a callback for each readable socket.   #
+# Callbacks run in this thread, so they must not   #
+# block; real work goes to the worker pool.        #
+####################################################
+    def __init__(self):
+        threading.Thread.__init__(self, daemon=True)
+        self.sel = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.pending = [] #changes requested by other threads
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.sel.register(self.wake_r, selectors.EVENT_READ, None)
+
+    def add(self, sock, callback):
+        """Call callback(sock) whenever sock is readable"""
+        self._change(sock.fileno(), sock, callback)
+
+    def remove(self, sock):
+        """Stop watching sock (caller closes it)"""
+        self._change(sock.fileno(), None, None)
+
+    def call(self, func, *args):
+        """Run func(*args) in the reactor thread"""
+        if threading.current_thread() is self:
+            func(*args)
+            return
+        self.lock.acquire()
+        self.pending.append((func, args))
+        self.lock.release()
+        self._wake()
+
+    def _change(self, fd, sock, callback):
+        if threading.current_thread() is self:
+            self._apply(fd, sock, callback) #safe to do it now
+            return
+        self.lock.acquire()
+        self.pending.append((self._apply, (fd, sock, callback)))
+        self.lock.release()
+        self._wake()
+
+    def _wake(self):
+        try:
+            self.wake_w.send(b'\0')
+        except OSError:
+            pass #a wakeup is pending already
+
+    def _apply(self, fd, sock, callback):
+        #unregister by fd, since sock may be closed by now
+        try:
+            self.sel.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+        if callback:
+            try:
+                self.sel.register(sock, selectors.EVENT_READ, callback)
+            except (ValueError, OSError) as ex:
+                ttprint("Reactor can't watch socket:", ex)
+
+    def run(self):
+        tprint("Reactor is up")
+        while True:
+            self.lock.acquire()
+            _changes, self.pending = self.pending, []
+            self.lock.release()
+            for func, args in _changes:
+                try:
+                    func(*args)
+                except Exception as ex:
+                    tprint("Exception in reactor:", ex)
+                    traceback.print_exc()
+            for key, _ in self.sel.select():
+                if key.data == None:
                     try:
-                        payload = cbor.loads(_decrypt_msg(rawmsg))
-                    except:
-                        ttprint("Multicast: CBOR decode error") #test mode to suppress QUADS warnings
-                        continue
-                    msg = _parse_msg(payload)
-                    if not msg:
-                        #invalid message, cannot process it
-                        ttprint(payload,saddr,sport,ifn)
-                        ttprint("Multicast: Invalid message format")
-                        continue
-                    ttprint("Multicast: CBOR->Python:", payload)
-                    if msg.mtype in (M_DISCOVERY, M_FLOOD):
-                        if _relay_needed:
-                            #ttprint("Send",msg.mtype,"from", ifn, "for relay")
-                            #Note that Flood relay needs the payload
-                            _relay(payload, msg, ifn)                         
-                        try:
-                            ttprint("Initiator:", str(ipaddress.IPv6Address(msg.id_source)))
-                            #queue for the mc handler
-                            _mcq.put([saddr, sport, ifn, msg],block=False)
-                        except:
-                            tprint("Multicast queue full: packet dropped")
-                            pass
-                    #note that unrecognized messages are simply ignored
-            except OSError:
-                tprint("No LL multicasts on interface for 2 minutes")
-                if _mc_restart:
-                    # Need to exit and restart if we can
-                    _mc_restart = False
-                    _mclisten().start()
-                    break #restarted, so this one can exit
-                else:
-                    _mc_restart = True  #restart anyway next time
-                                        #in case we missed a CPU wakeup
-                
+                        self.wake_r.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    key.data(key.fileobj)
+                except Exception as ex:
+                    tprint("Exception in reactor:", ex)
+                    traceback.print_exc()
+
+def _accept(listen_sock, handler, *args):
+    """Internal use only"""
+####################################################
+# Reactor callback for a listening socket: accept  #
+# a connection and wait for its first bytes, then  #
+# run handler(asock, aaddr, *args) in the reader   #
+# pool                                             #
+####################################################
+    try:
+        asock, aaddr = listen_sock.accept()
+    except OSError:
+        return #nothing to accept after all
+    #a slow peer must not hold a reader for long
+    asock.settimeout(_halfOpenTimeout/1000)
+    _await_request(asock, aaddr, _half_open, _halfOpenTimeout,
+                   handler, *args)
+
+def _await_request(asock, aaddr, waiting, timeout, handler, *args):
+    """Internal use only"""
+####################################################
+# Reactor thread: wait for bytes on connection     #
+# asock, then run handler(asock, aaddr, *args) in  #
+# the reader pool, which is kept apart from the    #
+# worker pool so that slow peers can't hold up     #
+# multicast handling.                              #
+#                                                  #
+# waiting is the dict of connections waiting like  #
+# this (_half_open for new ones, _kept_open for    #
+# kept-alive ones). At most _halfOpenLimit may     #
+# wait in each, for timeout milliseconds at most,  #
+# so silent peers can't use up sockets. These      #
+# dicts are only used in the reactor thread.       #
+####################################################
+    if len(waiting) >= _halfOpenLimit:
+        tprint("Too many idle connections: connection dropped")
+        asock.close()
+        return
+    def _ready(asock):
+        waiting.pop(asock).cancel()
+        _reactor.remove(asock)
+        if not _readers.submit(handler, asock, aaddr, *args):
+            tprint("Reader pool full: connection dropped")
+            asock.close()
+    waiting[asock] = call_later(timeout, _reactor.call,
+                                _await_expire, waiting, asock)
+    _reactor.add(asock, _ready)
+
+def _await_expire(waiting, asock):
+    """Internal use only"""
+####################################################
+# Reactor thread: drop a connection that sent      #
+# nothing before its deadline                      #
+####################################################
+    if waiting.pop(asock, None):
+        ttprint("Idle connection timed out")
+        _reactor.remove(asock)
+        asock.close()
+
+def _mc_open():
+    """Internal use only"""
+####################################################
+# Open the socket for GRASP link-local multicasts  #
+# (Discovery messages and synchronisation Flood    #
+# messages) and hand it to the reactor, replacing  #
+# any previous one.                                #
+####################################################
+    global _mc_sock, _mc_last
+    mcrsock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+    mcrsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    mcrsock.bind(('',GRASP_LISTEN_PORT))
+    #join LL multicast group on all interfaces
+    for x in _ll_zone_ids:
+        mreq = ALL_GRASP_NEIGHBORS_6.packed + struct.pack('@I', x[0])
+        while True:
+            try:
+                mcrsock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, mreq)
+                break
+            except:
+                #failed, probably too soon during restart so wait & retry
+                time.sleep(2)
+    mcrsock.setblocking(False)
+    _old = _mc_sock
+    _mc_sock = mcrsock
+    _mc_last = time.monotonic()
+    _reactor.add(mcrsock, _mc_readable)
+    if _old:
+        _reactor.remove(_old)
+        _old.close()
+    tprint("LL multicast listener is up")
+
+def _mc_readable(mcrsock):
+    """Internal use only"""
+####################################################
+# Reactor callback: read all waiting multicasts    #
+# and queue them for the multicast workers. Those  #
+# from the same source are handled in order, so an #
+# older flood can't overtake a newer one.          #
+####################################################
+    global _mc_last
+    for _ in range(64):    #don't starve other sockets
+        try:
+            rawmsg, send_addr = _recv_mc(mcrsock)
+        except OSError:
+            return         #nothing more to read
+        _mc_last = time.monotonic()
+        if not _mc_workers.submit(send_addr[0], _mc_received, rawmsg, send_addr):
+            tprint("Multicast workers full: multicast dropped")
+            _free_raw(rawmsg)
 
-def _relay(payload, msg, ifi):
+def _mc_received(rawmsg, send_addr):
+    """Internal use only"""
+####################################################
+# Worker job: handle one LL multicast and queue it #
+# for the discovery response pool or the flood     #
+# handler (and relay if needed)                    #
+####################################################
+    ttprint("Handling LL multicast")
+    if "%" in send_addr[0]:
+        a,b = send_addr[0].split('%')
+        saddr = ipaddress.IPv6Address(a)
+    else:
+        saddr = ipaddress.IPv6Address(send_addr[0])
+    sport = send_addr[1]
+    ifn = send_addr[3]
+    ttprint("Received multicast from",saddr,"port",
+            sport,"interface",ifn,"bytecount",len(rawmsg))
+    #Because we listen to ourselves in testing
+    #and because we can't trust IPV6_MULTICAST_LOOP = 0
+    if not _listen_self and [ifn, saddr] in _ll_zone_ids:
+        _free_raw(rawmsg)
+        return
+    _cost = len(rawmsg)
+    try:
+        payload = _decode_raw(rawmsg)
+    except:
+        ttprint("Multicast: CBOR decode error") #test mode to suppress QUADS warnings
+        return
+    msg = _parse_msg(payload)
+    if not msg:
+        #invalid message, cannot process it
+        ttprint(payload,saddr,sport,ifn)
+        ttprint("Multicast: Invalid message format")
+        return
+    ttprint("Multicast: CBOR->Python:", payload)
+    if msg.mtype in (M_DISCOVERY, M_FLOOD):
+        if _relay_needed:
+            #ttprint("Send",msg.mtype,"from", ifn, "for relay")
+            #Note that Flood relay needs the payload
+            _relay(payload, msg, ifn, saddr, sport)
+        ttprint("Initiator:", str(ipaddress.IPv6Address(msg.id_source)))
+        _flow = (str(saddr), ifn)
+        if msg.mtype == M_DISCOVERY:
+            #queue for the discovery response pool
+            _discq.put(_flow, M_DISCOVERY,
+                       (_mc_discovery, (saddr, sport, ifn, msg)), _cost,
+                       urgent = msg.obj.name in _mcPriority)
+        else:
+            #queue for the flood handler
+            _floodq.put(_flow, M_FLOOD, [saddr, sport, ifn, msg], _cost,
+                        urgent = any(lo.obj.name in _mcPriority
+                                     for lo in msg.flood_list))
+    #note that unrecognized messages are simply ignored
+
+def _mc_check():
+    """Internal use only"""
+####################################################
+# Timer action: if no multicasts have arrived for  #
+# a while, restart the listener if a system wakeup #
+# was detected (or at the next check in any case,  #
+# in case we missed a CPU wakeup)                  #
+####################################################
+    global _mc_restart
+    if time.monotonic() - _mc_last < _mcIdle:
+        return
+    tprint("No LL multicasts on interface for 2 minutes")
+    if _mc_restart:
+        _mc_restart = False
+        _workers.submit(_mc_open) #it may sleep, so not in timer thread
+    else:
+        _mc_restart = True
+
+def _relay(payload, msg, ifi, saddr, sport):
     """Internal use only"""
 ####################################################
 # Relay GRASP link-local multicasts (Discovery and #
@@ -3717,26 +5371,21 @@ def _relay(payload, msg, ifi):
 # message, since we send the payload out again in  #
 # the Flood case.                                  #
 #                                                  #
-# Lazy code: only controls loops using loop count  #
-# and doesn't throttle rate. Note that we must not #
-# throttle in line here because that would block   #
-# the multicast listener - instead we need to queue#
-# the relays for a separate thread that implements #
-# the throttle.                                    #
+# Loops are controlled by loop count and by        #
+# session ID and initiator, remembered in the      #
+# _relayed dedupe set for _dedupeWindow, so        #
+# floods need no session cache entry. Floods are   #
+# not sent here but queued for the relay scheduler #
+# (_relayer), which throttles them without         #
+# blocking the multicast listener.                 #
 ####################################################
 
     r_shandle = _session_handle(msg.id_value, msg.id_source)
     
     # drop message if this is a looping relay
-    sess = _get_session(r_shandle)
-    if sess:
-        if sess.id_relayed:
-            ttprint("Dropping a looping relayed multicast", msg.mtype)
-            return
-        else:
-            #mark the session as relayed
-            sess.id_relayed = True
-            _update_session(sess)            
+    if _relayed.seen((msg.id_value, msg.id_source)):
+        ttprint("Dropping a looping relayed multicast", msg.mtype)
+        return
            
     if msg.mtype == M_FLOOD:
         uobj = payload[_Pl_FCon][_Fo_Fobj] #first objective in unparsed flood
@@ -3744,47 +5393,296 @@ def _relay(payload, msg, ifi):
         if uobj[_Ob_LCt] < 1:
             return #do nothing
         #ttprint("relaying", uobj[_Ob_Nam],"flood with loop ct", uobj[_Ob_LCt])
-        if not sess:
-            #insert session id for the relayed copies
-            news = _session_instance(r_shandle.id_value,True,r_shandle.id_source)
-            news.id_relayed = True
-            _insert_session(news)
         msg_bytes = _encrypt_msg(cbor.dumps(payload))
-        for i in range(len(_ll_zone_ids)):                
-            ttprint("Flood relay for", uobj[_Ob_Nam])
-            if _ll_zone_ids[i][0] != ifi: # will skip the relay source interface
-                _mcssocks[i][1].sendto(msg_bytes,0,(str(ALL_GRASP_NEIGHBORS_6), GRASP_LISTEN_PORT))
-        _disactivate_flood(r_shandle).start() #will disactivate session ID later
+        #hand it to the relay scheduler; a newer flood of the same
+        #objectives from the same originator replaces it
+        _key = (msg.id_source, tuple(lo.obj.name for lo in msg.flood_list))
+        _relayer.add(_key, msg_bytes, ifi)
     elif msg.mtype == M_DISCOVERY:
         msg.obj.loop_count -=1 #decrement loop count
         if msg.obj.loop_count < 1:
             return #do nothing
-        # reuse discover function in relay mode, but kick it off
-        # as a separate thread with fresh copy of objective         
-        _disc_relay(r_shandle, _oclone(msg.obj), ifi).start()
+        # reuse discover function in relay mode, run by the relay
+        # worker pool with fresh copy of objective. If the same
+        # objective is being relayed already from the same
+        # interface with the same loop count, it covers the same
+        # links, so just add this originator to the ones its
+        # results are forwarded to.
+        _orig = (saddr, sport, ifi, msg.id_value, msg.id_source)
+        _fkey = (msg.obj.name, ifi, msg.obj.loop_count)
+        _relay_lock.acquire()
+        _origs = _relay_flights.get(_fkey)
+        if _origs:
+            _origs.append(_orig)
+            ttprint("Joined discovery relay for", msg.obj.name)
+        elif _relay_workers.submit(_relay_discovery, r_shandle,
+                                   _oclone(msg.obj), ifi):
+            _relay_flights[_fkey] = [_orig]
+        else:
+            ttprint("Discovery relay queue full: not relayed")
+        _relay_lock.release()
 
 
-class _disactivate_flood(threading.Thread):
+class _dedupe_set:
     """Internal use only"""
-    def __init__(self, shandle):
-        threading.Thread.__init__(self, daemon=True)
-        self.shandle = shandle
-    def run(self):
-        time.sleep(GRASP_DEF_TIMEOUT/500)
-        ttprint("Disactivating flood session")
-        _disactivate_session(self.shandle)
+####################################################
+# Time-bounded set of recently seen keys, for      #
+# duplicate suppression of multicasts. Two         #
+# generations of plain sets rotate every half      #
+# window (or sooner if one reaches _dedupeMax),    #
+# so a key is remembered for between half and all  #
+# of the window, and memory stays bounded.         #
+####################################################
+    def __init__(self, window):
+        self.lock = threading.Lock()
+        self.half = window/2000 # seconds
+        self.current = set()
+        self.previous = set()
+        self.rotated = time.monotonic()
+
+    def seen(self, key):
+        """True if key was seen recently, else remember it"""
+        self.lock.acquire()
+        _now = time.monotonic()
+        if _now - self.rotated > self.half or len(self.current) >= _dedupeMax:
+            if _now - self.rotated > 2*self.half:
+                self.previous = set() #both generations are stale
+            else:
+                self.previous = self.current
+            self.current = set()
+            self.rotated = _now
+        if key in self.current or key in self.previous:
+            self.lock.release()
+            return True
+        self.current.add(key)
+        self.lock.release()
+        return False
 
-class _disc_relay(threading.Thread):
+class _token_bucket:
     """Internal use only"""
-    def __init__(self, shandle, obj, ifi):
+####################################################
+# Token bucket: rate tokens per second, up to      #
+# burst. Not thread-safe; used only by the relay   #
+# scheduler.                                       #
+####################################################
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.when = time.monotonic()
+
+    def _fill(self):
+        _now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (_now - self.when)*self.rate)
+        self.when = _now
+
+    def take(self):
+        """Use a token if there is one"""
+        self._fill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait(self):
+        """Seconds until a token is due"""
+        self._fill()
+        return max(0, (1 - self.tokens)/self.rate)
+
+class _relay_scheduler(threading.Thread):
+    """Internal use only"""
+####################################################
+# Flood relay scheduler                            #
+#                                                  #
+# Sends relayed floods on every interface except   #
+# the one they came from, limited by a token       #
+# bucket per interface (_relayRate, _relayBurst)   #
+# and per originator (one per _minRelayGap, with   #
+# _relayOrigBurst), so a relay node can't amplify  #
+# a flood storm. The originator limits are loose   #
+# enough for a node whose ASAs flood many          #
+# objectives each period. At most _relayQlimit     #
+# floods wait, and drops are counted per           #
+# originator for relay_drops(); a newer flood for  #
+# the same key (originator and objective names)    #
+# replaces a waiting one.                          #
+####################################################
+    def __init__(self):
         threading.Thread.__init__(self, daemon=True)
-        self.shandle = shandle
-        self.obj = obj
-        self.ifi = ifi
+        self.cond = threading.Condition()
+        self.pending = collections.OrderedDict() #key -> [msg_bytes, interface indexes, charged]
+        self.ifi_buckets = {}
+        self.orig_buckets = {}
+        self.dropped = collections.Counter() #by originator
+
+    def add(self, key, msg_bytes, ifi):
+        """Queue a flood that arrived on interface ifi"""
+        _targets = set(i for i in range(len(_ll_zone_ids))
+                       if _ll_zone_ids[i][0] != ifi) # skip the relay source interface
+        if not _targets:
+            return
+        self.cond.acquire()
+        if key in self.pending:
+            #coalesce: keep its place, send the newer one everywhere
+            self.pending[key] = [msg_bytes, _targets, False]
+        elif len(self.pending) >= _relayQlimit:
+            self.dropped[key[0]] += 1
+            ttprint("Relay queue full: flood not relayed from", key[0])
+        else:
+            self.pending[key] = [msg_bytes, _targets, False]
+            self.cond.notify()
+        self.cond.release()
+
+    def _bucket(self, buckets, key, rate, burst):
+        if key not in buckets:
+            buckets[key] = _token_bucket(rate, burst)
+        return buckets[key]
+
+    def _send(self, work):
+        #send what the token buckets allow, return
+        #(seconds until more can be sent, what was sent)
+        _nap = 1
+        _sent = []
+        for key, x in work:
+            msg_bytes, _targets, _charged = x
+            if not _charged:
+                _ob = self._bucket(self.orig_buckets, key[0],
+                                   1000/_minRelayGap, _relayOrigBurst)
+                if not _ob.take():
+                    #originator must wait its turn
+                    _nap = min(_nap, _ob.wait())
+                    continue
+                x[2] = True
+            _done = set()
+            for i in _targets:
+                _ib = self._bucket(self.ifi_buckets, i, _relayRate, _relayBurst)
+                if not _ib.take():
+                    _nap = min(_nap, _ib.wait())
+                    continue
+                try:
+                    ttprint("Flood relay for", key[1])
+                    _mcssocks[i][1].sendto(msg_bytes,0,_mcDest)
+                except OSError as ex:
+                    ttprint("Flood relay socket error", ex)
+                _done.add(i)
+            _sent.append((key, x, _done))
+        if len(self.orig_buckets) > 10*_relayQlimit:
+            #forget originators that are quiet (full bucket)
+            self.orig_buckets = {k: b for k, b in self.orig_buckets.items()
+                                 if b.wait() > 0 or b.tokens < b.burst}
+        return _nap, _sent
+
     def run(self):
-        ttprint("Discovery relay for", self.obj.name, self.obj.loop_count)
+        tprint("Flood relay scheduler up")
+        while True:
+            self.cond.acquire()
+            while not self.pending:
+                self.cond.wait()
+            _work = list(self.pending.items())
+            self.cond.release()
+            _nap, _sent = self._send(_work)
+            self.cond.acquire()
+            for key, x, _done in _sent:
+                if self.pending.get(key) is x: #not replaced meanwhile
+                    x[1] -= _done
+                    if not x[1]:
+                        del self.pending[key]
+            if self.pending:
+                #wait for tokens, or for a new flood
+                self.cond.wait(max(_nap, _timerTick/1000/10))
+            self.cond.release()
+
+def _relay_discovery(shandle, obj, ifi):
+    """Internal use only"""
+####################################################
+# Relay worker job: discover obj in relay mode on  #
+# all interfaces except ifi. Responses are         #
+# forwarded to the originator(s) as they arrive,   #
+# by _relay_forward().                             #
+####################################################
+    ttprint("Discovery relay for", obj.name, obj.loop_count)
+    _fkey = (obj.name, ifi, obj.loop_count)
+    try:
         #set timeout to 1s per loop count 20170528
-        discover(None, self.obj, _discTimeoutUnit*self.obj.loop_count, relay_ifi=self.ifi, relay_shandle=self.shandle)
+        discover(None, obj, _discTimeoutUnit*obj.loop_count, relay_ifi=ifi, relay_shandle=shandle)
+    finally:
+        _relay_lock.acquire()
+        del _relay_flights[_fkey]
+        _relay_lock.release()
+
+def _relay_forward(fkey):
+    """Internal use only"""
+####################################################
+# Send what the discovery cache now holds for the  #
+# objective to each originator of the relayed      #
+# discovery fkey (name, interface, loop count), as #
+# a Divert response. Locators found on an          #
+# originator's own link are left out, since it can #
+# discover them itself; another relay of the same  #
+# objective may have put them in the cache.        #
+####################################################
+    _relay_lock.acquire()
+    _origs = list(_relay_flights.get(fkey, []))
+    _relay_lock.release()
+    _disc_lock.acquire()
+    x = _discovery_cache.get(fkey[0])
+    ll = list(x.asa_locators) if x else []
+    _disc_lock.release()
+    for _orig in _origs:
+        _send_divert(_orig, [y for y in ll if y.ifi != _orig[2]])
+
+def _send_divert(orig, ll):
+    """Internal use only"""
+####################################################
+# Send a Divert response built from ll, a list of  #
+# asa_locators in the discovery cache, to orig,    #
+# the (address, port, interface, session ID,       #
+# initiator) of a discovery                        #
+####################################################
+    from_addr, from_port, from_ifi, id_value, id_source = orig
+    #Build Divert option
+    ttprint("Build Divert option")
+    _ttl = 0
+    #20220316 - fixed failure to use _option class here
+    divo = _option(O_DIVERT)
+    for y in ll:
+        #ttprint("Discovery cache entry", y.is_ipaddress, y.locator, y.ifi, y.expire, int(time.monotonic()))
+        if y.is_ipaddress:
+            if (not y.locator.is_link_local) and \
+               (y.expire > int(time.monotonic())): #not LL and not expired                                    
+                                           
+                #build locator option (only supports IPv6, TCP)
+                lo = [O_IPv6_LOCATOR, y.locator.packed, socket.IPPROTO_TCP, y.port]                                    
+                divo.embedded.append(lo)
+                if _test_divert:
+                    break # to avoid duplicates during local testing
+        elif y.is_fqdn:
+            divo.embedded.append([O_FQDN_LOCATOR, y.locator, y.protocol, y.port])
+        elif y.is_uri:
+            divo.embedded.append([O_URI_LOCATOR, y.locator])
+        #calculate worst case TTL
+        if y.expire > 0:
+            if _ttl > 0:
+                _ttl = min(int((y.expire - time.monotonic())*1000),_ttl)
+            else:
+                _ttl = int((y.expire - time.monotonic())*1000)
+        
+    if _ttl == 0:
+        _ttl = _discCacheDefTimeOut  
+    if len(divo.embedded):
+        #create TCP socket
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        sock.settimeout(1) #discovery requester should always be waiting
+        try:
+            sock.connect((str(from_addr), from_port,0,from_ifi))
+            msg_bytes = _ass_message(M_RESPONSE, id_value, id_source,
+                                     _ttl, divo)
+            sock.sendall(msg_bytes,0)
+            ttprint("Sent divert response")
+        except OSError as ex:
+            tprint("Socket error when sending divert Response", ex)
+        #we don't need this socket again
+        sock.close()
 
 def _init_drsocks(i):
     """Internal use only"""
@@ -3813,9 +5711,8 @@ def _init_drsocks(i):
                 ifi = _mcssocks[i][0]
                 _mcssocks[i][1] = _try_mcsock(ifi)
                 continue
-            _drlt = _drlisten(_s, _ll_zone_ids[i][0])
             tprint("Starting a discovery TCP listener for interface", _s.getsockname(), _ll_zone_ids[i][0])
-            _drlt.start()
+            _drlisten(_s, _ll_zone_ids[i][0])
             return
         except OSError as ex:
             ttprint(ex)
@@ -3826,409 +5723,425 @@ def _init_drsocks(i):
     raise RuntimeError("Cannot get free port for discovery TCP listener")
     
 
-class _drlisten(threading.Thread):
+def _drlisten(sock, ifi):
     """Internal use only"""
 ####################################################
 # Listen for discovery responses on a given socket #
 #                                                  #
-# Socket must be bound to a port already           #
-# This runs as a thread and exits after timeout.   #
+# Socket must be bound to a port already.          #
+# The reactor accepts connections and the worker   #
+# pool handles them with _dr_response().           #
 #                                                  #
-# This thread is invoked for the Discover function #
-# and must not be activated otherwise.             #
+# This listener is for the Discover function only. #
 ####################################################
-    def __init__(self, sock, ifi):
-        threading.Thread.__init__(self, daemon=True)
-        self.sock = sock
-        self.ifi = ifi
-    def run(self):
-        tprint("Discovery response listener for interface",self.ifi,"is up") 
-        while True:
-            self.sock.listen(5)         
+    _old = _drsocks.get(ifi)
+    if _old:
+        _reactor.remove(_old)
+        _old.close()
+    _drsocks[ifi] = sock
+    sock.listen(5)
+    sock.setblocking(False)
+    _reactor.add(sock, lambda s: _accept(s, _dr_response, ifi))
+    tprint("Discovery response listener for interface",ifi,"is up") 
+
+def _dr_response(asock, aaddr, ifi):
+    """Internal use only"""
+####################################################
+# Reader job: read a discovery response and queue  #
+# it for the discovery session                     #
+####################################################
+    try:
+        rawmsg, send_addr = _recvraw(asock)
+    except OSError as ex:
+        tprint("Discovery response socket error", ex)
+        asock.close()
+        return
+    asock.close() 
+    if '%' in aaddr[0]:
+        a,b = aaddr[0].split('%') #strip any Zone ID
+    else:
+        a = aaddr[0]
+    send_addr=ipaddress.IPv6Address(a)
+    try:
+        payload = _decode_raw(rawmsg)
+        ttprint("Received response: CBOR->Python:", payload)
+        msg = _parse_msg(payload)
+        if not msg:
+            ttprint("Invalid Response message: packet dropped")
+        elif msg.mtype != M_RESPONSE:
+            ttprint("Not a Response message: packet dropped")
+        else:
+            #find the correct session queue
+            sid = msg.id_value  # session ID
+            sini = msg.id_source # session initiator
+            s=_get_session(_session_handle(sid,sini))
+            if s:
+                # (give up silently if no such session)
+                if s.id_dq:
+                    # (give up silently if session has no queue)
+                    #queue for the discovery response handler
+                    try:
+                        ttprint("Queueing response")
+                        s.id_dq.put([send_addr,ifi,msg],block=False)
+                    except:
+                        tprint("Discovery response queue full or absent: packet dropped")
+    except:
+        tprint("Discovery response: CBOR decode error")
+
+
+
+def _ass_response(x, ifi, rapid):
+    """Internal use only"""
+####################################################
+# Assemble the reusable part of a discovery        #
+# response for registered objective x, as seen     #
+# from interface ifi: TTL, locator option(s) and,  #
+# for rapid mode, the objective.                   #
+#                                                  #
+# returns (objective version, item count, CBOR)    #
+####################################################
+    _v = x.version #read before the value, in case it changes
+    if x.locators:
+        #we have a specified list of asa_locator(s)
+        _alist = x.locators
+    else:
+        #normal objective - create an asa_locator
+        if x.local or (_my_address == None):
+            #either link-local address is required, or we
+            #have no global address, may as well send link-local
+            for y in _ll_zone_ids:                            
+                if y[0] == ifi:
+                    _a = y[1]                              
+        else:
+            _a = _my_address
+        _aloc = asa_locator(_a, None, False)                                    
+        _aloc.protocol = x.protocol
+        _aloc.port = x.port
+        _aloc.is_ipaddress = True
+        _alist = [_aloc]
+    _items = [x.ttl]
+    for _aloc in _alist:
+        #build locator option (only supports IPv6)
+        _items.append([O_IPv6_LOCATOR, _aloc.locator.packed, _aloc.protocol, _aloc.port])
+    if rapid:
+        #plus the objective, for rapid mode
+        _items.append(_ass_obj(x.objective))
+    return _v, len(_items), b''.join(cbor.dumps(i) for i in _items)
+
+def _cbor_array_head(n):
+    """Internal use only"""
+####################################################
+# CBOR header for an array of n items              #
+####################################################
+    if n < 24:
+        return bytes([0x80 + n])
+    elif n < 0x100:
+        return bytes([0x98, n])
+    elif n < 0x10000:
+        return b'\x99' + n.to_bytes(2, 'big')
+    return b'\x9a' + n.to_bytes(4, 'big')
+
+def _clear_responses():
+    """Internal use only"""
+####################################################
+# Discard all cached discovery responses, after    #
+# registry or address changes.                     #
+#                                                  #
+# Copy-on-write: _mchandler takes its reference    #
+# before reading the registry and addresses, so a  #
+# response built from stale data can only land in  #
+# the discarded cache.                             #
+####################################################
+    global _resp_cache
+    _resp_cache = {}
+
+def _mc_discovery(from_addr, from_port, from_ifi, msg):
+    """Internal use only"""
+####################################################
+# Discovery worker job: answer one Discovery       #
+# multicast, from a local objective or from the    #
+# discovery cache.                                 #
+#                                                  #
+# This runs in the _resp_workers pool, so a slow   #
+# or unreachable requester holds up one worker for #
+# its connect timeout, not the flood handler.      #
+####################################################
+    if (not test_mode) and (msg.id_value == _i_sent_it) and not _multi_asas:
+        # hack to ignore self-sent discoveries if multiple instances and
+        # running with _listen_self == True
+        ttprint("Dropping own discovery multicast")
+        return
+    elif DULL and not from_addr.is_link_local:
+        ttprint("DULL dropping non-local packet")
+        return
+    elif DULL and msg.obj.loop_count != 1:
+        ttprint("DULL dropping discovery with bad loop count")
+        return
+    ttprint("Got multicast Discovery msg")
+
+    if _test_divert:
+        ttprint("_mc_discovery: _test_divert",_test_divert)
+
+    #Is the objective registered in this node?
+    try:
+        oname = msg.obj.name
+        _found = False
+        _rapid = False
+        #take the response cache before looking at
+        #the registry or addresses, see _clear_responses()
+        _cache = _resp_cache
+        if not _test_divert:                        
+            x = _obj_registry.get(oname)
+            if x and x.discoverable:
+                #Yes, we have it, can send unicast response
+                #(including the objective, for rapid mode)
+                _found = x.objective
+                _rapid = x.rapid
+        
+        if _found:
+            #found it locally, respond immediately
+            #using the cached encoding of everything
+            #after the session ID and initiator
+            _key = (oname, from_ifi, _rapid)
+            _enc = _cache.get(_key)
+            if not _enc or _enc[0] != x.version:
+                _enc = _ass_response(x, from_ifi, _rapid)
+                _cache[_key] = _enc
+            msg_bytes = _encrypt_msg(_cbor_array_head(3 + _enc[1]) +
+                                     cbor.dumps(M_RESPONSE) +
+                                     cbor.dumps(msg.id_value) +
+                                     cbor.dumps(msg.id_source) +
+                                     _enc[2])
+                
+            #create TCP socket and send message
+            sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+            sock.settimeout(1) #discovery requester should always be waiting
             try:
-                ttprint("Listening for discovery response")
-                asock, aaddr = self.sock.accept()
-                rawmsg, send_addr = _recvraw(asock)
-                asock.close() 
-                if '%' in aaddr[0]:
-                    a,b = aaddr[0].split('%') #strip any Zone ID
-                else:
-                    a = aaddr[0]
-                send_addr=ipaddress.IPv6Address(a)
-                #ttprint("Received TCP", _decrypt_msg(rawmsg), "from", send_addr)
-                try:
-                    payload = cbor.loads(_decrypt_msg(rawmsg))
-                    ttprint("Received response: CBOR->Python:", payload)
-                    msg = _parse_msg(payload)
-                    if not msg:
-                        ttprint("Invalid Response message: packet dropped")
-                    elif msg.mtype != M_RESPONSE:
-                        ttprint("Not a Response message: packet dropped")
-                    else:
-                        #find the correct session queue
-                        sid = msg.id_value  # session ID
-                        sini = msg.id_source # session initiator
-                        s=_get_session(_session_handle(sid,sini))
-                        if s:
-                            # (give up silently if no such session)
-                            if s.id_dq:
-                                # (give up silently if session has no queue)
-                                #queue for the discovery response handler
-                                try:
-                                    ttprint("Queueing response")
-                                    s.id_dq.put([send_addr,self.ifi,msg],block=False)
-                                except:
-                                    tprint("Discovery response queue full or absent: packet dropped")
-                except:
-                    tprint("Discovery response: CBOR decode error")
+                #ttprint("Connecting",from_addr, from_port)
+                sock.connect((str(from_addr), from_port,0,from_ifi))
+                #ttprint("Sending",msg_bytes)
+                sock.sendall(msg_bytes,0)
+                ttprint("Sent local response")
             except OSError as ex:
-                tprint("Discovery response socket error", ex)
-                pass     #keep trying anyway
+                tprint("Socket error when sending local discovery Response", ex)
+            #we don't need this socket again
+            sock.close()
+            
+        elif not DULL:
+                                
+            # Not local - do we have it in the cache?
+            # We will come here too if _test_divert is set
 
+            #ttprint("Search discovery cache")
+            
+            _disc_lock.acquire()
 
+            #ttprint("Acquired _disc_lock")
+            
+            ll = False
+            x = _discovery_cache.get(oname)
+            if x: #found the objective
+                ll = x.asa_locators
+                if ll:  #it has not expired
+                    _discovery_cache.move_to_end(oname)   #make it Most Recently Used
+            _disc_lock.release()
+            if ll:
+                _send_divert((from_addr, from_port, from_ifi,
+                              msg.id_value, msg.id_source), ll)
+            else:
+                #ttprint("Not in discovery cache")
+                pass
+        else:
+            tprint("DULL discovery failure")
+            pass
+    except OSError:
+        #invalid discovery format - do nothing
+        tprint("Discovery message has invalid content")
 
 class _mchandler(threading.Thread):
     """Internal use only"""
 ####################################################
-# Multicast queue handler                          #
+# Flood queue handler                              #
 #                                                  #
-# This runs forever as a thread.                   #
-#                                                  #
-# This version is lazy: Floods queue behind        #
-# Discovery responses.                             #
+# This runs forever as a thread, draining _floodq. #
+# It only updates the flood cache, so floods are   #
+# never delayed by Discovery responses, which are  #
+# sent by _mc_discovery() in their own pool.       #
 ####################################################
     def __init__(self):
         threading.Thread.__init__(self, daemon=True)
 
     def run(self):
-        global _i_sent_it
-        global _multi_asas
-        tprint("Multicast queue handler up")
+        tprint("Flood queue handler up")
         while True:
             try:      #this is to catch unknown bug 20190724
-                mc = _mcq.get()
-                ttprint("Multicast handler got something", mc)
+                mc = _floodq.get()
+                ttprint("Flood handler got something", mc)
                 from_addr = mc[0]
-                from_port = mc[1]
                 from_ifi = mc[2]
                 msg = mc[3]
-                if (not test_mode) and (msg.mtype == M_DISCOVERY) and \
-                   (msg.id_value == _i_sent_it) and not _multi_asas:
-                    # hack to ignore self-sent discoveries if multiple instances and
-                    # running with _listen_self == True
-                    ttprint("Dropping own discovery multicast")
-
-                elif DULL and not from_addr.is_link_local:
+                if DULL and not from_addr.is_link_local:
                     ttprint("DULL dropping non-local packet")
-
-                elif DULL and msg.mtype == M_DISCOVERY and msg.obj.loop_count != 1:
-                    ttprint("DULL dropping discovery with bad loop count")
-
-                elif DULL and msg.mtype == M_FLOOD and \
-                     msg.flood_list[0].obj.loop_count != 1:
+                    continue
+                elif DULL and msg.flood_list[0].obj.loop_count != 1:
                     ttprint("DULL dropping flood with bad loop count")
-                                        
-                elif msg.mtype == M_DISCOVERY:
-                    ttprint("Got multicast Discovery msg")
-                
-                    if _test_divert:
-                        ttprint("mchandler: _test_divert",_test_divert)
-
-                    #Is the objective registered in this node?
-                    try:
-                        oname = msg.obj.name
-                        _found = False
-                        _rapid = False
-                        _normal = True
-                        if not _test_divert:                        
-                            _obj_lock.acquire()
-                            for x in _obj_registry:
-                                if x.objective.name == oname and x.discoverable:
-                                    #Yes, we have it, can send unicast response
-                                    #(including the objective, for rapid mode)
-                                    _found = x.objective
-                                    _rapid = x.rapid
-                                    _ttl = x.ttl
-                                    if x.locators:
-                                        #we have a specified list of asa_locator(s)
-                                        _alist = x.locators
-                                        _normal = False
-                                    else:
-                                        #normal objective - create an asa_locator
-                                        if x.local or (_my_address == None):
-                                            #either link-local address is required, or we
-                                            #have no global address, may as well send link-local
-                                            for y in _ll_zone_ids:                            
-                                                if y[0] == from_ifi:
-                                                    _a = y[1]                              
-                                        else:
-                                            _a = _my_address
-                                        _aloc = asa_locator(_a, None, False)                                    
-                                        _aloc.protocol = x.protocol
-                                        _aloc.port = x.port
-                                        _aloc.is_ipaddress = True
-                                        _alist = [_aloc]
-                                    break
-                            _obj_lock.release()
-                        
-                        if _found:
-                            #found it locally, respond immediately
-                            _los = []
-                            for _aloc in _alist:
-                                #build locator option (only supports IPv6)
-                                _los.append([O_IPv6_LOCATOR, _aloc.locator.packed, _aloc.protocol, _aloc.port])
-
-                            #assemble response message with variable number of locators
-                            #plus the objective, for rapid mode
-                            if _rapid:
-                                msg_bytes = _ass_message(M_RESPONSE, msg.id_value, msg.id_source,
-                                                     _ttl, _los, _found)
-                            else:
-                                msg_bytes = _ass_message(M_RESPONSE, msg.id_value, msg.id_source,
-                                                     _ttl, _los)
-                                
-                            #create TCP socket and send message
-                            sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
-                            sock.settimeout(1) #discovery requester should always be waiting
-                            try:
-                                #ttprint("Connecting",from_addr, from_port)
-                                sock.connect((str(from_addr), from_port,0,from_ifi))
-                                #ttprint("Sending",msg_bytes)
-                                sock.sendall(msg_bytes,0)
-                                ttprint("Sent local response")
-                            except OSError as ex:
-                                tprint("Socket error when sending local discovery Response", ex)
-                            #we don't need this socket again
-                            sock.close()
+                    continue
+                if _floods_seen.seen((msg.id_value, msg.id_source)):
+                    #already had this one, e.g. via another relay
+                    ttprint("Dropping duplicate flood")
+                    continue
+                ttprint("Got Flood message, TTL=", msg.ttl)
+
+                lobjs = msg.flood_list  #list of _flooded_objective
+                _tobjs = []
+
+                for lo in lobjs:
+                    #construct asa_locator from locator option
+                    if lo.loco:
+                        _locs = _opt_to_asa_loc(lo.loco, from_ifi, False)
+                        if len(_locs) == 1:
+                            _loc = _locs[0] #got exactly one locator
                             
-                        elif not DULL:
-                                                
-                            # Not local - do we have it in the cache?
-                            # We will come here too if _test_divert is set
-
-                            #ttprint("Search discovery cache")
-                            
-                            _disc_lock.acquire()
-
-                            #ttprint("Acquired _disc_lock")
-                            
-                            # Can't use a comprehension because we need the actual
-                            # list entry in order to delete it.
-                            ll = False
-                            for i in range(len(_discovery_cache)):
-                                x = _discovery_cache[i]                        
-                                if x.objective.name == oname: #found the objective
-                                    ll = x.asa_locators
-                                    if ll:  #it has not expired
-                                        del(_discovery_cache[i])
-                                        _discovery_cache.append(x)   #make it Most Recently Used                                 
-                                    break   #quit the search
-                            _disc_lock.release()
-                            if ll:
-                                #Build Divert option
-                                ttprint("Build Divert option")
-                                _ttl = 0
-                                #20220316 - fixed failure to use _option class here
-                                divo = _option(O_DIVERT)
-                                for y in ll:
-                                    #ttprint("Discovery cache entry", y.is_ipaddress, y.locator, y.ifi, y.expire, int(time.monotonic()))
-                                    if y.is_ipaddress:
-                                        if (not y.locator.is_link_local) and \
-                                           (y.expire > int(time.monotonic())): #not LL and not expired                                    
-                                                                       
-                                            #build locator option (only supports IPv6, TCP)
-                                            lo = [O_IPv6_LOCATOR, y.locator.packed, socket.IPPROTO_TCP, y.port]                                    
-                                            divo.embedded.append(lo)
-                                            if _test_divert:
-                                                break # to avoid duplicates during local testing
-                                    elif y.is_fqdn:
-                                        divo.embedded.append([O_FQDN_LOCATOR, y.locator, y.protocol, y.port])
-                                    elif y.is_uri:
-                                        divo.embedded.append([O_URI_LOCATOR, y.locator])
-                                    #calculate worst case TTL
-                                    if y.expire > 0:
-                                        if _ttl > 0:
-                                            _ttl = min(int((y.expire - time.monotonic())*1000),_ttl)
-                                        else:
-                                            _ttl = int((y.expire - time.monotonic())*1000)
-                                    
-                                if _ttl == 0:
-                                    _ttl = _discCacheDefTimeOut  
-                                if len(divo.embedded):
-                                    #create TCP socket
-                                    sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
-                                    sock.settimeout(1) #discovery requester should always be waiting
-                                    try:
-                                        sock.connect((str(from_addr), from_port,0,from_ifi))
-                                        msg_bytes = _ass_message(M_RESPONSE, msg.id_value, msg.id_source,
-                                                                 _ttl, divo)
-                                        sock.sendall(msg_bytes,0)
-                                        ttprint("Sent divert response")
-                                    except OSError as ex:
-                                        tprint("Socket error when sending divert Response", ex)
-                                    #we don't need this socket again
-                                    sock.close()
-                            else:
-                                #ttprint("Not in discovery cache")
-                                pass
                         else:
-                            tprint("DULL discovery failure")
-                            pass
-                    except OSError:
-                        #invalid discovery format - do nothing
-                        tprint("Discovery message has invalid content")
-                elif msg.mtype == M_FLOOD:
-                    ttprint("Got Flood message, TTL=", msg.ttl)
-
-                    lobjs = msg.flood_list  #list of _flooded_objective
-
-                    for lo in lobjs:
-                        #construct asa_locator from locator option
-                        if lo.loco:
-                            _locs = _opt_to_asa_loc(lo.loco, from_ifi, False)
-                            if len(_locs) == 1:
-                                _loc = _locs[0] #got exactly one locator
-                                
-                            else:
-                                tprint("Anomalous locator in flood ignored")
-                                _loc = asa_locator(None, None, False)
-                        else:
-                            ttprint("No locator in flooded objective")
+                            tprint("Anomalous locator in flood ignored")
                             _loc = asa_locator(None, None, False)
-                        if msg.ttl > 0:
-                            _loc.expire = int(time.monotonic() + msg.ttl/1000)
-                            ttprint("Setting expiry",_loc.expire)
-                        else:
-                            _loc.expire = 0
-
-                        #construct and store objective
-                        obj = lo.obj                      
-                        #ttprint(obj.name,"flood has loop ct",obj.loop_count,"from ifi",from_ifi)
-                        obj = _detag_obj(obj)
-                        if obj.synch: #must be a synch objective
-                            _flood_lock.acquire()
-                            #zap objective if already cached
-                            #zap expired objectives as we go
-                            for j in range(len(_flood_cache)):
-                                if _flood_cache[j].objective.name == obj.name and \
-                                   _flood_cache[j].source.locator == _loc.locator and \
-                                   _flood_cache[j].source.port == _loc.port:
-                                    #found it, zap old version
-                                    _flood_cache[j] = None
-                                    
-                                elif _flood_cache[j].source.expire !=0 and \
-                                     _flood_cache[j].source.expire < int(time.monotonic()):
-                                    #expired entry, zap it
-                                    #ttprint("MC handler expiring flood",_flood_cache[j].objective.name,
-                                    #        _flood_cache[j].source.expire)
-                                    _flood_cache[j] = None
-                                    
-                            #garbage collect
-                            j=0
-                            while j < len(_flood_cache):
-                                if _flood_cache[j] == None:
-                                    del _flood_cache[j]
-                                else:
-                                    j += 1
-                            
-                            #if cache is full, delete oldest
-                            if len(_flood_cache) >= _floodCacheLimit:
-                                del(_flood_cache[0])
-                            #concatenate new one in MRU position
-                            _flood_cache.append(tagged_objective(obj,_loc))    
-                            _flood_lock.release()
-                            #ttprint(obj.name,"flood appended")                            
-                else:
-                    # Some other message such as M_NOOP, drop it
-                    pass
+                    else:
+                        ttprint("No locator in flooded objective")
+                        _loc = asa_locator(None, None, False)
+                    if msg.ttl > 0:
+                        _loc.expire = int(time.monotonic() + msg.ttl/1000)
+                        ttprint("Setting expiry",_loc.expire)
+                    else:
+                        _loc.expire = 0
+
+                    #construct objective
+                    obj = lo.obj                      
+                    #ttprint(obj.name,"flood has loop ct",obj.loop_count,"from ifi",from_ifi)
+                    obj = _detag_obj(obj)
+                    if obj.synch: #must be a synch objective
+                        _tobjs.append(tagged_objective(obj,_loc))
+
+                #store them all, replacing any old versions
+                _flood_lock.acquire()
+                #zap expired objectives first
+                _reap_floods(int(time.monotonic()))
+                for _t in _tobjs:
+                    _store_flood(_t)
+                _flood_lock.release()
             except Exception as ex:
                 tprint("Unexpected exception in _mchandler:", ex)
                 traceback.print_exc()
-                #and we just wait for the next multicast message
+                #and we just wait for the next flood message
 
 
 
-class _tcp_listen(threading.Thread):
+def _tcp_listen(listen_sock, shared=False):
     """Internal use only"""
 #########################################################
-# TCP listener thread for synch and negotiate requests  #
+# TCP listener for synch and negotiate requests         #
+#                                                       #
+# The reactor accepts connections and the worker pool   #
+# handles them with _tcp_request(). A shared listener   #
+# serves every objective and is never closed.           #
 #########################################################
-    def __init__(self, listen_sock):
-        threading.Thread.__init__(self, daemon=True)
-        self.listen_sock = listen_sock
-
-    def run(self):
+    listen_sock.listen(5)
+    listen_sock.setblocking(False)
+    if shared:
+        _reactor.add(listen_sock,
+                     lambda s: _accept(s, _tcp_request, None))
+    else:
+        _reactor.add(listen_sock,
+                     lambda s: _accept(s, _tcp_request, s))
+    ttprint("A TCP request listener is up on port", listen_sock.getsockname()[1])
 
-        
-        self.listen_sock.listen(5)
-        self.listen_sock.settimeout(None) #listeners will block
-
-        # For ever, wait for incoming connections and queue them
-        # for the listening ASA (if any).
-        ttprint("A TCP request listener is up on port", self.listen_sock.getsockname()[1])
-        found = True #this will change if objective becomes unregistered
-        while found:
-            try:
-                asock, aaddr = self.listen_sock.accept()
-                asock.set_inheritable(True)
-                ttprint("Talking on",asock.getsockname())
-                rawmsg, send_addr = _recvraw(asock)
-                if '%' in aaddr[0]:
-                    a,b = aaddr[0].split('%') #strip any Zone ID
-                else:
-                    a = aaddr[0]
-                send_addr=ipaddress.IPv6Address(a)
-                #ttprint("Received TCP", rawmsg, "from", send_addr,"bytecount",len(rawmsg))
-                try:
-                    payload = cbor.loads(_decrypt_msg(rawmsg))
-                    ttprint("Received request: CBOR->Python:", payload)
-                    msg = _parse_msg(payload)
-                    if not msg:
-                        tprint("Invalid Request message: packet dropped")
-                        asock.close()
-                    elif msg.mtype == M_INVALID:
-                        tprint("Got M_INVALID", msg.id_value, msg.content)
-                        asock.close()
-                    elif not msg.mtype in (M_REQ_SYN, M_REQ_NEG):
-                        ttprint("Not a Request message: packet dropped")
-                        asock.close()
+def _tcp_request(asock, aaddr, listen_sock):
+    """Internal use only"""
+#########################################################
+# Reader job: read a synch or negotiate request and     #
+# queue it for the listening ASA (if any)               #
+#                                                       #
+# listen_sock is None for the shared listener           #
+#########################################################
+    found = True #this will change if objective becomes unregistered
+    try:
+        asock.set_inheritable(True)
+        ttprint("Talking on",asock.getsockname())
+        rawmsg, send_addr = _recvraw(asock)
+    except OSError as ex:
+        tprint("Request listener socket error", ex)
+        asock.close()
+        return
+    if len(rawmsg) == 0:
+        #peer closed, e.g. a kept-alive connection
+        asock.close()
+        return
+    if '%' in aaddr[0]:
+        a,b = aaddr[0].split('%') #strip any Zone ID
+    else:
+        a = aaddr[0]
+    send_addr=ipaddress.IPv6Address(a)
+    #ttprint("Received TCP from", send_addr,"bytecount",len(rawmsg))
+    try:
+        payload = _decode_raw(rawmsg)
+        ttprint("Received request: CBOR->Python:", payload)
+        msg = _parse_msg(payload)
+        if not msg:
+            tprint("Invalid Request message: packet dropped")
+            asock.close()
+        elif msg.mtype == M_INVALID:
+            tprint("Got M_INVALID", msg.id_value, msg.content)
+            asock.close()
+        elif not msg.mtype in (M_REQ_SYN, M_REQ_NEG):
+            ttprint("Not a Request message: packet dropped")
+            asock.close()
+        else:
+            #check whether ASA is listening
+            queued = False
+            found = False
+            # no lock needed, _obj_registry is copy-on-write
+            x = _obj_registry.get(msg.obj.name)
+            if x:
+                found = True
+                ttprint("Listener found ",msg.obj.name," listening=",x.listening)
+                if x.listening:
+                    #check that flags match
+                    if not ((x.objective.neg == msg.obj.neg) or
+                            (x.objective.dry == msg.obj.dry) or 
+                            (x.objective.synch == msg.obj.synch)):
+                        #oops, mismatch
+                        ttprint("Request mismatches capability")
+                    elif msg.mtype == M_REQ_SYN and x.synch_listen:
+                        #GRASP answers for the ASA
+                        if _synch_reply(x, asock, msg):
+                            #wait for the next request
+                            _reactor.call(_await_request, asock, aaddr,
+                                          _kept_open, 2*_synchIdle,
+                                          _tcp_request, listen_sock)
+                        queued = True
+                    elif msg.mtype == M_REQ_NEG and \
+                         x.listening <= int(x.synch_listen):
+                        #only GRASP is listening, for synch requests;
+                        #no negotiator would ever read the queue
+                        ttprint("No negotiation listener for", msg.obj.name)
                     else:
-                        #check whether ASA is listening
-                        queued = False
-                        found = False
-                        _obj_lock.acquire()
-                        for x in _obj_registry: #??? once seemed to fail in reentrant case?
-                            if x.objective.name == msg.obj.name:
-                                found = True
-                                ttprint("Listener found ",msg.obj.name," listening=",x.listening)
-                                if x.listening:
-                                    #check that flags match
-                                    if not ((x.objective.neg == msg.obj.neg) or
-                                            (x.objective.dry == msg.obj.dry) or 
-                                            (x.objective.synch == msg.obj.synch)):
-                                        #oops, mismatch
-                                        ttprint("Request mismatches capability")
-                                        break                                
-                                    #queue socket,sender,and message for the ASA
-                                    try:
-                                        x.listen_q.put([asock,send_addr,msg],block=False)
-                                        queued = True
-                                        ttprint("Request queued for ASA")
-                                    except:
-                                        tprint("ASA queue error: packet dropped")                            
-                        _obj_lock.release()
-                        if not queued:
-                            # no listener for this objective
-                            asock.close()
-                except:
-                    tprint("Listener: CBOR decode error")
-                    asock.close()
-            except OSError as ex:
-                tprint("Request listener socket error", ex)
-                pass     #go round again
-        #if we get here, the objective has vanished
-        ttprint("Listener exiting on port", self.listen_sock.getsockname()[1])
-        self.listen_sock.close()
+                        #queue socket,sender,and message for the ASA
+                        try:
+                            x.listen_q.put([asock,send_addr,msg],block=False)
+                            queued = True
+                            ttprint("Request queued for ASA")
+                        except:
+                            tprint("ASA queue error: packet dropped")                            
+            if not queued:
+                # no listener for this objective
+                asock.close()
+            if not found and listen_sock:
+                #the objective has vanished
+                ttprint("Listener exiting on port", listen_sock.getsockname()[1])
+                _reactor.remove(listen_sock)
+                listen_sock.close()
+    except:
+        tprint("Listener: CBOR decode error")
+        asock.close()
 # end of TCP listener
 
 class _watcher(threading.Thread):
@@ -4285,6 +6198,7 @@ class _watcher(threading.Thread):
             elif _new_locator and (_new_locator != _my_address):
                 tprint("IPv6 address changed to",_new_locator)
                 _my_address = _new_locator
+                _clear_responses()
                 _said_no_route = False
                 # flag MC handler to restart on timeout
                 _mc_restart = True
@@ -4293,11 +6207,143 @@ class _watcher(threading.Thread):
                 if not _said_no_route:
                     tprint("No routeable IPv6 address, using link local")
                     _said_no_route = True
-                _my_address = None
+                if _my_address != None:
+                    _my_address = None
+                    _clear_responses()
                 # flag MC handler to restart on timeout
                 _mc_restart = True
 
 
+class timer_handle:
+    """
+A delayed action returned by call_later() or call_every().
+Call its cancel() method to stop it.
+"""
+    def __init__(self, due, interval, func, args):
+        self.due = due            #tick number when due
+        self.interval = interval  #ticks between repeats, 0 if one-shot
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Stop the action (no effect if it already ran)"""
+        self.cancelled = True
+
+class _timer_thread(threading.Thread):
+    """Internal use only"""
+####################################################
+# Hierarchical timer wheel                         #
+#                                                  #
+# Runs all delayed actions (session disactivation, #
+# cache expiry, periodic refloods...) in a single  #
+# thread. Each level has _wheelSlots slots; level  #
+# 0 slots are one tick, level 1 slots are one turn #
+# of level 0, and so on. Entries are cascaded down #
+# a level each time the level below wraps round.   #
+# Entries too far ahead for the top level wait in  #
+# an overflow list.                                #
+####################################################
+    _levels = 3
+
+    def __init__(self):
+        threading.Thread.__init__(self, daemon=True)
+        self.lock = threading.Lock()
+        self.wheels = [[[] for _ in range(_wheelSlots)]
+                       for _ in range(self._levels)]
+        self.overflow = []
+        self.tick = 0
+        self.start_time = time.monotonic()
+
+    def _place(self, t):
+        """Put a timer_handle in the right slot. Caller holds self.lock"""
+        span = 1
+        for level in range(self._levels):
+            if t.due//(span*_wheelSlots) == self.tick//(span*_wheelSlots):
+                self.wheels[level][(t.due//span)%_wheelSlots].append(t)
+                return
+            span *= _wheelSlots
+        self.overflow.append(t)
+
+    def schedule(self, delay, interval, func, args):
+        """Create and place a timer_handle"""
+        _ticks = max(1, -(-int(delay)//_timerTick))  #round up
+        _repeat = 0
+        if interval:
+            _repeat = max(1, -(-int(interval)//_timerTick))
+        self.lock.acquire()
+        t = timer_handle(self.tick + _ticks, _repeat, func, args)
+        self._place(t)
+        self.lock.release()
+        return t
+
+    def _advance(self):
+        """Move on one tick, return due entries. Caller holds self.lock"""
+        self.tick += 1
+        #cascade from the highest level down
+        span = _wheelSlots**self._levels
+        if not self.tick%span:
+            _l, self.overflow = self.overflow, []
+            for t in _l:
+                self._place(t)
+        for level in range(self._levels-1, 0, -1):
+            span //= _wheelSlots
+            if not self.tick%span:
+                _slot = (self.tick//span)%_wheelSlots
+                _l, self.wheels[level][_slot] = self.wheels[level][_slot], []
+                for t in _l:
+                    self._place(t)
+        _slot = self.tick%_wheelSlots
+        _due, self.wheels[0][_slot] = self.wheels[0][_slot], []
+        return _due
+
+    def run(self):
+        while True:
+            _next = self.start_time + (self.tick+1)*_timerTick/1000
+            _wait = _next - time.monotonic()
+            if _wait > 0:
+                time.sleep(_wait)
+            self.lock.acquire()
+            _due = self._advance()
+            self.lock.release()
+            for t in _due:
+                if t.cancelled:
+                    continue
+                if t.interval:
+                    #reschedule before calling, so that
+                    #func can cancel its own timer
+                    t.due += t.interval
+                    self.lock.acquire()
+                    self._place(t)
+                    self.lock.release()
+                try:
+                    t.func(*t.args)
+                except Exception as ex:
+                    tprint("Exception in timer action:", ex)
+                    traceback.print_exc()
+
+_timer_lock = threading.Lock()
+_timer_wheel = None
+
+def _get_timer_wheel():
+    """Internal use only"""
+####################################################
+# Return the timer wheel, starting it if needed    #
+####################################################
+    global _timer_wheel
+    _timer_lock.acquire()
+    if not _timer_wheel:
+        _timer_wheel = _timer_thread()
+        _timer_wheel.start()
+    _timer_lock.release()
+    return _timer_wheel
+
+def _timed_reap_floods():
+    """Internal use only"""
+    _flood_lock.acquire()
+    _reap_floods(int(time.monotonic()))
+    _flood_lock.release()
+
 class _figger(threading.Thread):
     """Internal use only"""
 
@@ -4316,7 +6362,8 @@ class _figger(threading.Thread):
 
     def run(self):
 
-        global _multicast_size, _unicast_size
+        global _multicast_size, _unicast_size, _floodCacheLimit
+        global _discHoldDown
 
         time.sleep(4)  #ensure that GRASP initialisation is done
 
@@ -4332,6 +6379,8 @@ class _figger(threading.Thread):
                 self.grasp_version = 2
                 self.max_multicast = 3
                 self.max_unicast = 4
+                self.max_flood_cache = 5
+                self.disc_hold_down = 6
                 
         cp = codepoints()
 
@@ -4386,6 +6435,18 @@ class _figger(threading.Thread):
                     if _usize != _unicast_size and _usize > GRASP_DEF_MAX_SIZE and _usize < 10*GRASP_DEF_MAX_SIZE:
                         tprint("Changing max unicast size to", _usize)
                         _unicast_size = _usize
+                if cp.max_flood_cache in reply.value:
+                    #configure flood cache limit
+                    _fsize = reply.value[cp.max_flood_cache]
+                    if _fsize != _floodCacheLimit and _fsize >= 100 and _fsize <= 100000:
+                        tprint("Changing flood cache limit to", _fsize)
+                        _floodCacheLimit = _fsize
+                if cp.disc_hold_down in reply.value:
+                    #configure negative discovery hold-down
+                    _hold = reply.value[cp.disc_hold_down]
+                    if _hold != _discHoldDown and _hold >= 0 and _hold <= _discHoldMax:
+                        tprint("Changing discovery hold-down to", _hold)
+                        _discHoldDown = _hold
 
             time.sleep(70)
 
@@ -4402,10 +6463,10 @@ structures for interactive debugging. Not thread-safe.
         for x in _ll_zone_ids:
             print(x)
         print("\nASA registry contents:\n---------------------")       
-        for x in _asa_registry:
+        for x in _asa_registry.values():
             print(x.name,"handle:",x.handle)
     print("\nObjective registry contents:\n---------------------------")         
-    for x in _obj_registry:
+    for x in _obj_registry.values():
         o= x.objective
         print(o.name,"ASA:",x.asa_id,"Listen:",x.listening,"Port", x.port,"Neg:",o.neg,
                "Synch:",o.synch,"Count:",o.loop_count,"Value:",o.value)
@@ -4413,19 +6474,27 @@ structures for interactive debugging. Not thread-safe.
             print("Predefined locators:", x.locators)
     if not partial:
         print("\nDiscovery cache contents:\n------------------------")
-        for x in _discovery_cache:
+        for x in _discovery_cache.values():
             print(x.objective.name,"locators:")
             for y in x.asa_locators:
                 print(y.locator, y.protocol, y.port, "Diverted:",y.diverted,"Expiry:",y.expire)
             if x.received:
                 print("Received",x.received.name,"rapid value",x.received.value)
+    if not partial:
+        print("\nMulticast drops:\n----------------")
+        for x, n in _drops_by_source.items():
+            print("Source:", x[0], "interface:", x[1], "dropped:", n)
+        for x, n in _drops_by_type.items():
+            print("Message type:", x, "dropped:", n)
+        for x, n in relay_drops().items():
+            print("Relay from:", x, "dropped:", n)
     print("\nFlood cache contents:\n--------------------")            
-    for x in _flood_cache:
+    for x in _flood_cache.values():
         print(x.objective.name,"count:",x.objective.loop_count,"value:", x.objective.value,
               "source:",x.source.locator, x.source.protocol, x.source.port, x.source.expire)
     if not partial:
         print("\nSession ID cache contents:\n-------------------------")         
-        for x in _session_id_cache:
+        for x in _session_id_cache.values():
             print("Handle:",'{:8}'.format(x.id_value),"Source:",x.id_source,"Active:",x.id_active,
                   "Relayed:",x.id_relayed)
 
@@ -4467,14 +6536,22 @@ def _initialise_grasp():
     # (a necessary nuisance)           #
     ####################################
     global _asa_registry
+    global _asa_handles
     global _asa_lock
     global _obj_registry
     global _obj_lock
     global _discovery_cache
+    global _disc_flights
+    global _disc_negative
+    global _disc_refresher
     global _disc_lock
     global _session_id_cache
+    global _session_inactive
+    global _session_values
     global _sess_lock
     global _flood_cache
+    global _flood_index
+    global _flood_expiry
     global _flood_lock
     global _print_lock
     global _tls_required
@@ -4482,7 +6559,40 @@ def _initialise_grasp():
     global _secure
     global DULL, _be_dull
     global _rapid_supported
-    global _mcq
+    global _floodq
+    global _discq
+    global _resp_workers
+    global _drops_by_source
+    global _drops_by_type
+    global _drop_lock
+    global _reactor
+    global _workers
+    global _readers
+    global _mc_workers
+    global _half_open
+    global _kept_open
+    global _resp_cache
+    global _synch_pooling
+    global _synch_conns
+    global _synch_conn_lock
+    global _synch_reaper
+    global _synch_caching
+    global _synch_max_age
+    global _synch_results
+    global _synch_cache_lock
+    global _synch_hits
+    global _synch_misses
+    global _flood_batching
+    global _flood_window
+    global _flood_batch
+    global _flood_batch_lock
+    global _flood_timer
+    global _mc_sock
+    global _mc_last
+    global _drsocks
+    global _shared_sock
+    global _recv_pool
+    global _cbor_views
     global _drq
     global _my_address
     global _my_link_local
@@ -4491,6 +6601,12 @@ def _initialise_grasp():
     global _said_no_route
     global _mcssocks
     global _relay_needed
+    global _relayer
+    global _relayed
+    global _relay_workers
+    global _relay_flights
+    global _relay_lock
+    global _floods_seen
     global _mc_restart
     global _i_sent_it
     global _multi_asas
@@ -4629,12 +6745,45 @@ def _initialise_grasp():
     _i_sent_it = 0              # Initialise hack to detect own discoveries
     _multi_asas = False         # Initialise multiple ASA status
     
-    _mcq = queue.Queue(_multQlimit) # Limits number of queued multicasts
+    _floodq = _fair_queue(_multQlimit, _multicast_size) # Limits number of queued floods
+    _discq = _fair_queue(_multQlimit, _multicast_size) # Limits number of queued discoveries
+    _drops_by_source = collections.Counter()
+    _drops_by_type = collections.Counter()
+    _drop_lock = threading.Lock()
+    _relayed = _dedupe_set(_dedupeWindow)
+    _relay_flights = {}         # originators of relayed discoveries, by
+                                # (name, interface, loop count)
+    _relay_lock = threading.Lock()
+    _floods_seen = _dedupe_set(_dedupeWindow)
+    _recv_pool = _buffer_pool(_poolBufSize, _poolBufCount)
+    try:
+        cbor.loads(memoryview(b'\x00'))
+        _cbor_views = True
+    except:
+        _cbor_views = False # old cbor library needs bytes
 
 
     _asa_lock = threading.Lock()          # Create and acquire locks 
     _obj_lock = threading.Lock()
     _disc_lock = threading.Lock()
+    _disc_flights = {}
+    _disc_negative = {}
+    _disc_refresher = None
+    _synch_pooling = False
+    _synch_conns = {}           # idle synch connections by peer
+    _synch_conn_lock = threading.Lock()
+    _synch_reaper = None
+    _synch_caching = False
+    _synch_max_age = None
+    _synch_results = collections.OrderedDict() # empty LRU dict of synch results
+    _synch_cache_lock = threading.Lock()
+    _synch_hits = 0
+    _synch_misses = 0
+    _flood_batching = False
+    _flood_window = _floodBatchWindow
+    _flood_batch = {}           # batched floods by (ttl, loop count)
+    _flood_batch_lock = threading.Lock()
+    _flood_timer = None
     _sess_lock = threading.Lock()
     _flood_lock = threading.Lock()
     _asa_lock.acquire()             # Acquire locks
@@ -4643,11 +6792,16 @@ def _initialise_grasp():
     _sess_lock.acquire()
     _flood_lock.acquire()
 
-    _asa_registry = []          # empty list of _asa_instance
-    _obj_registry = []          # empty list of _registered_objective
-    _discovery_cache = []       # empty list of _discovered_objective
-    _session_id_cache = []      # empty list of _session_instance
-    _flood_cache = []           # empty list of objective
+    _asa_registry = {}          # empty dict of _asa_instance
+    _asa_handles = {}           # empty dict of _asa_instance
+    _obj_registry = {}          # empty dict of _registered_objective
+    _discovery_cache = collections.OrderedDict() # empty LRU dict of _discovered_objective
+    _session_id_cache = {}      # empty dict of _session_instance
+    _session_inactive = collections.OrderedDict() # empty eviction queue
+    _session_values = collections.Counter() # no session IDs in use
+    _flood_cache = collections.OrderedDict() # empty dict of tagged_objective
+    _flood_index = {}           # empty index of flood cache by name
+    _flood_expiry = []          # empty heap of flood expiry times
 
     _asa_lock.release()         # Release locks
     _obj_lock.release()
@@ -4726,6 +6880,23 @@ def _initialise_grasp():
     # unicast Discovery responses      # 
     ####################################
 
+    ####################################
+    # Start reactor and worker pool    #
+    ####################################
+
+    _workers = _worker_pool(_reactorWorkers, _workQlimit)
+    _readers = _worker_pool(_readWorkers, _readQlimit)
+    _mc_workers = _keyed_pool(_mcWorkers, _workQlimit//_mcWorkers)
+    _resp_workers = _worker_pool(_respWorkers, _multQlimit, _discq)
+    _reactor = _reactor_thread()
+    _half_open = {}
+    _kept_open = {}
+    _resp_cache = {}            # encoded discovery responses
+    _shared_sock = None
+    _reactor.start()
+    _drsocks = {}
+    _mc_sock = None
+
     for _i in range(len(_ll_zone_ids)):
         _init_drsocks(_i)
 
@@ -4734,10 +6905,14 @@ def _initialise_grasp():
     ####################################
 
     _relay_needed = False
+    _relayer = None
     if len(_ll_zone_ids) > 1 and not DULL:
         # start thread to relay incoming Discovery and
         # Synchronisation multicasts
         _relay_needed = True
+        _relayer = _relay_scheduler()
+        _relayer.start()
+        _relay_workers = _worker_pool(_relayWorkers, _relayDiscQlimit)
         tprint("Multicast relay needed")
     else:
         tprint("Multicast relay not needed")
@@ -4752,11 +6927,24 @@ def _initialise_grasp():
 
     # Start multicast _listener(s)
     _mc_restart = False
-    _mclisten().start()
-    # Start multicast queue handler
+    _mc_open()
+    call_every(_mcIdle*1000, _mc_check)
+    # Start flood queue handler
     _mchandler().start()
     ttprint("Set up multicast listening")
 
+    ####################################
+    # Start shared TCP listener if     #
+    # requested                        #
+    ####################################
+
+    if _share_port:
+        _shared_sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        _shared_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        _shared_sock.bind(('',0))
+        _tcp_listen(_shared_sock, shared=True)
+        ttprint("Set up shared TCP listener")
+
 
     ####################################
     # Start thread to keep an eye on   #
@@ -4766,6 +6954,12 @@ def _initialise_grasp():
     _watcher().start()
     ttprint("Set up ACP watcher")
 
+    ####################################
+    # Start timer actions              #
+    ####################################
+
+    call_every(_floodReapInterval, _timed_reap_floods)
+
     _grasp_initialised = True
 
     ####################################
@@ -4795,6 +6989,8 @@ _be_dull = False               # referenced by skip_dialogue()
 _skip_dialogue = False         # referenced by skip_dialogue()
 _silent = False                # Print by default
 _figging = True                # Run configger by default
+_share_port = False            # referenced by skip_dialogue()
+_shared_sock = None            # shared TCP listener, if any
 _dobubbles = False             # Don't bubble print by default
 _bubbleQ = queue.Queue(100)    # Will be used if bubble printing
 
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks for GRASP. Like grasptests.py, this pretends to
+be a pair of ASAs talking to each other in one Python context. It
+needs no other GRASP node, but it does need the usual ACP
+environment (a usable link-local address). Run it directly:
+
+    python3 graspbench.py
+
+Results are printed with tprint(); timings depend heavily on the
+machine, so only compare runs on the same machine."""
+
+import grasp
+import threading
+import time
+import socket
+import tracemalloc
+import os
+
+def _median(l):
+    l = sorted(l)
+    return l[len(l)//2]
+
+####################################
+# negotiate_step latency           #
+####################################
+
+def bench_negotiate(sizes=(1000, 10000, 60000), steps=20):
+    """Time negotiate_step round trips with objective values of
+    each size in sizes (bytes)"""
+    err, asa = grasp.register_asa("Bencher")
+    if err:
+        grasp.tprint("Can't register ASA:", grasp.etext[err])
+        return
+    grasp._multi_asas = True #so that we can discover ourself
+    obj = grasp.objective("EX-bench-neg")
+    obj.neg = True
+    obj.loop_count = 255
+    err = grasp.register_obj(asa, obj)
+    if err:
+        grasp.tprint("Can't register objective:", grasp.etext[err])
+        return
+
+    def server():
+        while True:
+            err, shandle, answer = grasp.listen_negotiate(asa, obj)
+            if err:
+                return
+            while True:
+                #echo whatever arrives until the client ends
+                err, temp, answer = grasp.negotiate_step(asa, shandle,
+                                                         answer, 5000)
+                if err or not temp:
+                    break
+    threading.Thread(target=server, daemon=True).start()
+    time.sleep(0.5)
+
+    err, ll = grasp.discover(asa, obj, 1000)
+    if err or not ll:
+        grasp.tprint("Can't discover benchmark objective")
+        return
+    for size in sizes:
+        obj.value = "x" * size
+        err, shandle, answer = grasp.req_negotiate(asa, obj, ll[0], 5000)
+        if err:
+            grasp.tprint("req_negotiate failed:", grasp.etext[err])
+            return
+        times = []
+        for i in range(steps):
+            t = time.perf_counter()
+            err, temp, answer = grasp.negotiate_step(asa, shandle,
+                                                     answer, 5000)
+            times.append(time.perf_counter() - t)
+            if err:
+                grasp.tprint("negotiate_step failed:", grasp.etext[err])
+                return
+        grasp.end_negotiate(asa, shandle, True)
+        grasp.tprint("negotiate_step", size, "bytes: median",
+                     round(_median(times)*1000, 2), "ms, max",
+                     round(max(times)*1000, 2), "ms")
+    grasp.stop_negotiate(asa, obj)
+    grasp.deregister_asa(asa, "Bencher")
+
+####################################
+# Multicast receive allocations    #
+####################################
+
+def bench_mc_alloc(packets=1000, size=1000):
+    """Compare memory allocated per packet by the old multicast
+    receive path (recvfrom, decrypt, decode) and _recv_mc() with
+    _decode_raw(), for packets carrying size bytes of value"""
+    obj = grasp.objective("EX-bench-mc")
+    obj.synch = True
+    obj.value = "x" * size
+    packet = grasp._ass_message(grasp.M_SYNCH, 1, None, obj)
+    rsock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+    rsock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    rsock.bind(('::1', 0))
+    ssock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+
+    def old_path():
+        rawmsg, send_addr = rsock.recvfrom(grasp._multicast_size)
+        return grasp.cbor.loads(grasp._decrypt_msg(rawmsg))
+
+    def new_path():
+        rawmsg, send_addr = grasp._recv_mc(rsock)
+        return grasp._decode_raw(rawmsg)
+
+    for name, path in (("old", old_path), ("_recv_mc", new_path)):
+        #timing, without tracemalloc overhead
+        t = 0
+        for i in range(packets):
+            ssock.sendto(packet, rsock.getsockname())
+            t0 = time.perf_counter()
+            path()
+            t += time.perf_counter() - t0
+        #allocations
+        pool_before = grasp._recv_pool.allocated
+        peak = 0
+        tracemalloc.start()
+        for i in range(packets):
+            ssock.sendto(packet, rsock.getsockname())
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            path()
+            peak += tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        grasp.tprint("Multicast receive,", name, "path,",
+                     grasp.cbor.__name__, "library, crypto", grasp._crypto, ":",
+                     len(packet), "byte packets,",
+                     peak//packets, "bytes peak allocation per packet,",
+                     grasp._recv_pool.allocated - pool_before,
+                     "new pool buffers,",
+                     round(t/packets*1e6, 1), "us per packet")
+    rsock.close()
+    ssock.close()
+
+####################################
+# Multicast send per interface     #
+####################################
+
+def bench_mc_send(interfaces=(1, 8, 64), floods=200, size=200):
+    """Compare CPU time to send a link-local flood over each number
+    of interfaces by the old path (full encode per interface) and
+    by encoding once for _mc_send(), with dummy sockets so that only
+    GRASP's own work is timed"""
+    err, asa = grasp.register_asa("McBencher")
+    if err:
+        grasp.tprint("Can't register ASA:", grasp.etext[err])
+        return
+    obj = grasp.objective("EX-bench-flood")
+    obj.synch = True
+    obj.loop_count = 1
+    obj.value = "x" * size
+    err = grasp.register_obj(asa, obj)
+    if err:
+        grasp.tprint("Can't register objective:", grasp.etext[err])
+        return
+    src = grasp.asa_locator(grasp._unspec_address, 0, False)
+    src.is_ipaddress = True #link-local flood
+    tagged = grasp.tagged_objective(obj, src)
+
+    class sink:
+        def sendto(self, msg_bytes, flags, addr):
+            self.sent = msg_bytes
+
+    def old_path():
+        #what flood() did before
+        for i in range(len(grasp._ll_zone_ids)):
+            _floodl = [[obj, [grasp.O_IPv6_LOCATOR,
+                              grasp._ll_zone_ids[i][1].packed,
+                              src.protocol, src.port]]]
+            msg_bytes = grasp._ass_message(grasp.M_FLOOD, 1,
+                            grasp._session_locator.packed, 0, _floodl)
+            grasp._mcssocks[i][1].sendto(msg_bytes, 0, grasp._mcDest)
+
+    def new_path():
+        #what flood() does now
+        _slot = os.urandom(16)
+        _floodl = [[obj, [grasp.O_IPv6_LOCATOR, _slot,
+                          src.protocol, src.port]]]
+        msg_bytes = grasp._ass_message(grasp.M_FLOOD, 1,
+                        grasp._session_locator.packed, 0, _floodl,
+                        encrypt=False)
+        grasp._mc_send(msg_bytes.split(_slot), "bench_mc_send()")
+
+    saved = grasp._ll_zone_ids, grasp._mcssocks
+    try:
+        for n in interfaces:
+            grasp._ll_zone_ids = [[i + 1, grasp.ipaddress.IPv6Address("fe80::%x" % (i + 1))]
+                                  for i in range(n)]
+            grasp._mcssocks = [[i + 1, sink()] for i in range(n)]
+            err = grasp.flood(asa, 0, tagged)
+            if err:
+                grasp.tprint("flood() failed:", grasp.etext[err])
+                return
+            for name, path in (("old", old_path), ("_mc_send", new_path)):
+                t = time.perf_counter()
+                for i in range(floods):
+                    path()
+                t = time.perf_counter() - t
+                grasp.tprint("Flood send,", name, "path, crypto", grasp._crypto,
+                             ":", n, "interfaces,",
+                             round(t/floods*1e6, 1), "us per flood,",
+                             round(t/floods/n*1e6, 1), "us per interface")
+    finally:
+        grasp._ll_zone_ids, grasp._mcssocks = saved
+    grasp.deregister_asa(asa, "McBencher")
+
+if __name__ == "__main__":
+    grasp.skip_dialogue(testing=False, selfing=True, diagnosing=False,
+                        figging=False)
+    bench_negotiate()
+    bench_mc_alloc()
+    bench_mc_send()
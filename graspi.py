@@ -51,14 +51,17 @@ def init(self):
 
 _most = ['objective', 'asa_locator', 'tagged_objective',
             'register_asa', 'deregister_asa', 'register_obj',
-            'deregister_obj', 'discover',
+            'deregister_obj', 'discover', 'discover_iter',
+            'discovery_refresh', 'synch_keepalive',
+            'synch_cache', 'synch_cache_stats', 'update_value',
+            'mc_drops', 'flood_batching', 'relay_drops',
             'negotiate_wait',
             'end_negotiate', 'listen_negotiate', 'stop_negotiate',
             'send_invalid',
             'synchronize', 'listen_synchronize', 'stop_synchronize',
             'flood', 'get_flood', 'expire_flood',
             'skip_dialogue', 'tprint', 'ttprint', 'init_bubble_text',
-            'dump_all',
+            'dump_all', 'call_later', 'call_every',
             'errors', 'etext']
 
 for t in _most:
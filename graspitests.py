@@ -120,8 +120,8 @@ class testASA(threading.Thread):
         boot_obj.synch = True
         err = graspi.listen_synchronize(boot_nonce, boot_obj)
         graspi.tprint("Listen synch", graspi.etext[err])
-        graspi.tprint(graspi.grasp._obj_registry[1].objective.name,
-                      "value", graspi.grasp._obj_registry[1].objective.value)
+        graspi.tprint(graspi.grasp._obj_registry["Boot"].objective.name,
+                      "value", graspi.grasp._obj_registry["Boot"].objective.value)
 
 ###################################
 # Test code: call Synchronize as from EX1
@@ -164,12 +164,12 @@ class testASA(threading.Thread):
 ###################################
 
         graspi.tprint("Objective registry contents:")         
-        for x in graspi.grasp._obj_registry:
+        for x in graspi.grasp._obj_registry.values():
             o= x.objective
             graspi.tprint(o.name,"ASA:",x.asa_id,"Listen:",x.listening,"Neg:",o.neg,
                    "Synch:",o.synch,"Count:",o.loop_count,"Value:",o.value)
         graspi.tprint("Flood cache contents:")            
-        for x in graspi.grasp._flood_cache:
+        for x in graspi.grasp._flood_cache.values():
             graspi.tprint(x.objective.name,"count:",x.objective.loop_count,"value:",
                          x.objective.value,"source:",x.source)
         time.sleep(5)
@@ -120,7 +120,7 @@ class testASA(threading.Thread):
         boot_obj.synch = True
         err = grasp.listen_synchronize(boot_nonce, boot_obj)
         grasp.tprint("Listen synch", grasp.etext[err])
-        grasp.tprint(grasp._obj_registry[1].objective.name, "value", grasp._obj_registry[1].objective.value)
+        grasp.tprint(grasp._obj_registry["Boot"].objective.name, "value", grasp._obj_registry["Boot"].objective.value)
 
 ###################################
 # Test code: call Synchronize as from EX1
@@ -163,12 +163,12 @@ class testASA(threading.Thread):
 ###################################
 
         grasp.tprint("Objective registry contents:")         
-        for x in grasp._obj_registry:
+        for x in grasp._obj_registry.values():
             o= x.objective
             grasp.tprint(o.name,"ASA:",x.asa_id,"Listen:",x.listening,"Neg:",o.neg,
                    "Synch:",o.synch,"Count:",o.loop_count,"Value:",o.value)
         grasp.tprint("Flood cache contents:")            
-        for x in grasp._flood_cache:
+        for x in grasp._flood_cache.values():
             grasp.tprint(x.objective.name,"count:",x.objective.loop_count,"value:",
                          x.objective.value,"source:",x.source)
         time.sleep(5)